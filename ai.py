@@ -1,18 +1,52 @@
 import random
-from typing import List, Tuple, Dict
+from operator import itemgetter
+from typing import List, Optional, Tuple
 from game_logic import Card, GameState
-from config import Config
+from config import Config, AI_LEVELS, AI_SEARCH_DEPTH
+from ai_kernel import (CARD_VALUES, NUM_CARDS, MoveTag, apply_move as apply_board_move,
+                       board_from_state, describe_move, legal_moves as board_legal_moves)
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Zobrist keys for the search transposition table: one random 64-bit number per
+# card int and location (the table or a player's hand), plus one per player for
+# the side to move.
+ZOBRIST_TABLE = [random.getrandbits(64) for _ in range(NUM_CARDS)]
+ZOBRIST_HAND = [
+    [random.getrandbits(64) for _ in range(NUM_CARDS)]
+    for _ in range(Config.MAX_PLAYERS_PER_ROOM)
+]
+ZOBRIST_TURN = [random.getrandbits(64) for _ in range(Config.MAX_PLAYERS_PER_ROOM)]
+
+# Transposition table bound flags
+TT_EXACT, TT_LOWER, TT_UPPER = 0, 1, 2
+
+
+def zobrist_hash(hands: Tuple[Tuple[int, ...], ...], table: Tuple[int, ...], player_idx: int) -> int:
+    """Hash an integer board and the side to move"""
+    h = ZOBRIST_TURN[player_idx]
+    for card in table:
+        h ^= ZOBRIST_TABLE[card]
+    for idx, hand in enumerate(hands):
+        keys = ZOBRIST_HAND[idx]
+        for card in hand:
+            h ^= keys[card]
+    return h
+
+
 class AIPlayer:
     """AI player for Chkobba game with multiple difficulty levels"""
     
     def __init__(self, difficulty: str = 'medium'):
-        if difficulty not in Config.AI_LEVELS:
+        if difficulty not in AI_LEVELS:
             raise ValueError(f"Invalid difficulty: {difficulty}")
         self.difficulty = difficulty
+        self.rng = random.Random()
+        # Fixed-size transposition table indexed by the low hash bits; a new entry
+        # simply replaces whatever occupied its slot, which bounds memory per game
+        self.tt: List[Optional[Tuple[int, int, int, int, Tuple[int, Tuple[int, ...]]]]] = [None] * Config.AI_TT_SIZE
+        self.tt_mask = Config.AI_TT_SIZE - 1
     
     def choose_move(self, game_state: GameState, player_idx: int) -> Tuple[Card, List[Card]]:
         """Choose best move based on difficulty level"""
@@ -30,7 +64,7 @@ class AIPlayer:
     
     def _easy_move(self, legal_moves: List[Tuple[Card, List[Card]]]) -> Tuple[Card, List[Card]]:
         """Easy: Random legal move"""
-        return random.choice(legal_moves)
+        return self.rng.choice(legal_moves)
     
     def _medium_move(self, legal_moves: List[Tuple[Card, List[Card]]], 
                     game_state: GameState, player_idx: int) -> Tuple[Card, List[Card]]:
@@ -39,87 +73,203 @@ class AIPlayer:
         1. Capture 7 of Diamonds (Haya)
         2. Complete Chkobba (capture all table cards)
         3. Maximize card value capture
-        4. Random fallback
+        Ties go to the first legal move.
         """
+        table_len = len(game_state.table)
         
-        haya_card = Card('7', 'D')
-        best_move = None
-        best_score = -1
+        def medium_score(move):
+            tag = describe_move(tuple(c._int for c in move[1]), table_len)
+            return (tag.has_haya * 100       # Bonus for capturing Haya
+                    + tag.is_chkobba * 50    # Bonus for Chkobba
+                    + tag.captured_value)    # Total captured value
         
-        for card, captured in legal_moves:
-            move_score = 0
-            
-            # Bonus for capturing Haya
-            if haya_card in captured:
-                move_score += 100
-            
-            # Bonus for Chkobba
-            if len(captured) == len(game_state.table):
-                move_score += 50
-            
-            # Score based on total captured value
-            move_score += sum(c.value for c in captured)
-            
-            if move_score > best_score:
-                best_score = move_score
-                best_move = (card, captured)
-        
-        return best_move if best_move else random.choice(legal_moves)
+        return max(legal_moves, key=medium_score)
     
     def _hard_move(self, legal_moves: List[Tuple[Card, List[Card]]], 
                   game_state: GameState, player_idx: int) -> Tuple[Card, List[Card]]:
-        """Hard: Advanced strategy with board evaluation
-        Considers:
-        1. Immediate scoring opportunities
-        2. Board state and remaining cards
-        3. Opponent protection
-        4. Long-term card management
+        """Hard: depth-limited alpha-beta negamax search
+        Looks AI_SEARCH_DEPTH plies ahead, scoring each move with
+        _evaluate_move and assuming every opponent replies with their best move.
+        The search runs on the integer board from ai_kernel.
+        The root moves are shuffled before the (stable) move ordering, so ties
+        between equally scored moves are broken at random without adding noise
+        to the evaluation.
+        """
+        hands, table = board_from_state(game_state)
+        root_moves = {
+            (card._int, tuple(c._int for c in captured)): (card, captured)
+            for card, captured in legal_moves
+        }
+        best_move = self.search_board(hands, table, player_idx, list(root_moves))
+        
+        if best_move not in root_moves:
+            return self.rng.choice(legal_moves)
+        return root_moves[best_move]
+    
+    def search_board(self, hands: Tuple[Tuple[int, ...], ...], table: Tuple[int, ...], player_idx: int,
+                     candidates: List[Tuple[int, Tuple[int, ...]]] = None) -> Optional[Tuple[int, Tuple[int, ...]]]:
+        """Run the hard search on an integer board and return the best (card, captured) ints
+        candidates are the root moves; they are generated from the board when omitted.
         """
+        if candidates is None:
+            candidates = list(board_legal_moves(hands[player_idx], table))
+        self.rng.shuffle(candidates)
+        
+        _, best_move = self._negamax(hands, table, AI_SEARCH_DEPTH,
+                                     float('-inf'), float('inf'), player_idx,
+                                     zobrist_hash(hands, table, player_idx), candidates, root=True)
+        return best_move
+    
+    def _negamax(self, hands: Tuple[Tuple[int, ...], ...], table: Tuple[int, ...], depth: int,
+                 alpha: float, beta: float, player_idx: int, h: int,
+                 legal_moves: List[Tuple[int, Tuple[int, ...]]] = None,
+                 root: bool = False) -> Tuple[float, Tuple[int, Tuple[int, ...]]]:
+        """Negamax search with alpha-beta pruning
+        
+        Returns (score, move) from player_idx's point of view. A move is worth its
+        own evaluation minus the value of the best reply, so the score is the net
+        advantage over the searched horizon. The search stops early when the
+        player to move has no cards left, since the next deal is unknown.
+        
+        h is the Zobrist hash of the board. Results are kept in self.tt so positions
+        reached through different move orders are only searched once.
+        legal_moves may be passed in when the caller already generated them.
+        The root never returns a stored result (the table outlives a turn, and that
+        would skip the random tie-break); its stored move is only tried first.
+        """
+        if depth == 0:
+            return 0, None
+        
+        alpha_orig = alpha
+        tt_move = None
+        slot = h & self.tt_mask
+        entry = self.tt[slot]
+        if entry is not None and entry[0] == h:
+            _, tt_depth, tt_score, tt_flag, tt_move = entry
+            if tt_depth >= depth and not root:
+                if tt_flag == TT_EXACT:
+                    return tt_score, tt_move
+                if tt_flag == TT_LOWER:
+                    alpha = max(alpha, tt_score)
+                else:
+                    beta = min(beta, tt_score)
+                if alpha >= beta:
+                    return tt_score, tt_move
+        
+        if legal_moves is None:
+            legal_moves = board_legal_moves(hands[player_idx], table)
+        if not legal_moves:
+            return 0, None
+        
+        table_len = len(table)
+        high_table_value = max((CARD_VALUES[c] for c in table), default=0)
+        tagged = self._order_moves(
+            [(move, describe_move(move[1], table_len)) for move in legal_moves], tt_move)
         
         best_move = None
         best_score = float('-inf')
+        next_player = (player_idx + 1) % len(hands)
+        turn_key = ZOBRIST_TURN[player_idx] ^ ZOBRIST_TURN[next_player]
+        hand_keys = ZOBRIST_HAND[player_idx]
         
-        for card, captured in legal_moves:
-            move_score = self._evaluate_move(card, captured, game_state, player_idx)
+        for (card, captured), tag in tagged:
+            score = self._evaluate_move(card, tag, high_table_value)
             
-            if move_score > best_score:
-                best_score = move_score
+            if depth > 1:
+                child_hands, child_table = apply_board_move(hands, table, player_idx, card, captured)
+                child_h = h ^ turn_key ^ hand_keys[card]
+                if captured:
+                    for c in captured:
+                        child_h ^= ZOBRIST_TABLE[c]
+                else:
+                    child_h ^= ZOBRIST_TABLE[card]
+                reply, _ = self._negamax(child_hands, child_table, depth - 1,
+                                         score - beta, score - alpha, next_player, child_h)
+                score -= reply
+            
+            if score > best_score:
+                best_score = score
                 best_move = (card, captured)
+            
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break  # Beta cutoff: the opponent will avoid this line
+        
+        if best_score <= alpha_orig:
+            flag = TT_UPPER
+        elif best_score >= beta:
+            flag = TT_LOWER
+        else:
+            flag = TT_EXACT
+        self.tt[slot] = (h, depth, best_score, flag, best_move)
+        
+        return best_score, best_move
+    
+    def _order_moves(self, tagged: List[Tuple[Tuple[int, Tuple[int, ...]], MoveTag]],
+                     tt_best: Tuple[int, Tuple[int, ...]] = None) -> List[Tuple[Tuple[int, Tuple[int, ...]], MoveTag]]:
+        """Sort (move, tag) pairs most promising first so alpha-beta prunes more
+        Order: Haya capture, Chkobba, captured value, number of cards captured.
+        The transposition table's best move, if any, is tried first.
+        """
+        ordered = sorted(tagged, key=itemgetter(1), reverse=True)
+        
+        if tt_best is not None:
+            for i, (move, _) in enumerate(ordered):
+                if move == tt_best:
+                    ordered.insert(0, ordered.pop(i))
+                    break
         
-        return best_move if best_move else random.choice(legal_moves)
+        return ordered
     
-    def _evaluate_move(self, card: Card, captured: List[Card], 
-                      game_state: GameState, player_idx: int) -> float:
-        """Evaluate move quality for hard difficulty"""
-        score = 0.0
+    def _evaluate_move(self, card: int, tag: MoveTag, high_table_value: int) -> int:
+        """Evaluate move quality for hard difficulty
+        Works on ai_kernel card ints and is deterministic, so it can be used as
+        the alpha-beta leaf evaluator. tag comes from describe_move and
+        high_table_value is the highest table card before the move; both are
+        computed once per position by the caller.
+        Weights are doubled so the score stays an int (no float boxing).
+        """
+        score = 0
         
         # Haya priority (7 of Diamonds)
-        haya = Card('7', 'D')
-        if haya in captured:
-            score += 100
+        if tag.has_haya:
+            score += 200
         
         # Chkobba bonus
-        if len(captured) == len(game_state.table):
-            score += 75
+        if tag.is_chkobba:
+            score += 150
         
         # Card value captured
-        captured_value = sum(c.value for c in captured)
-        score += captured_value * 2
+        score += tag.captured_value * 4
         
         # Hand management: prefer playing low cards when table has high cards
-        high_table_value = max((c.value for c in game_state.table), default=0)
-        if card.value < high_table_value and not captured:
-            score -= 10  # Slight penalty for leaving high cards on table
+        if CARD_VALUES[card] < high_table_value and not tag.captured_len:
+            score -= 20  # Slight penalty for leaving high cards on table
         
         # Diversity: avoid playing same value cards repeatedly
         # This encourages varied play
-        if captured:
-            score += len(captured) * 1.5
-        
-        # Random factor for unpredictability
-        score += random.uniform(-5, 5)
+        if tag.captured_len:
+            score += tag.captured_len * 3
         
         return score
     
     def __repr__(self):
         return f"AIPlayer({self.difficulty})"
+
+
+# AIPlayer per difficulty in each ai_worker.py process; the transposition table
+# is keyed by the full board, so it stays valid across turns, games and rooms
+_worker_players = {}
+
+
+def search_board_move(hands: Tuple[Tuple[int, ...], ...], table: Tuple[int, ...], player_idx: int,
+                      difficulty: str = 'hard') -> Optional[Tuple[int, Tuple[int, ...]]]:
+    """ai_worker.py entry point for the hard search
+    Takes and returns plain int tuples so only a few bytes cross the process boundary.
+    """
+    ai = _worker_players.get(difficulty)
+    if ai is None:
+        ai = _worker_players[difficulty] = AIPlayer(difficulty)
+    if not hands[player_idx]:
+        return None
+    return ai.search_board(hands, table, player_idx)
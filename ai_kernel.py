@@ -0,0 +1,99 @@
+from collections import namedtuple
+from functools import lru_cache
+from typing import Tuple
+from game_logic import Card, CARD_BY_INT, DINARI, HAYA, capture_positions
+
+# Integer board representation used by the AI search.
+#
+# Cloning a GameState per searched position is far too slow, so the search works
+# on plain tuples of card ints instead (Card.to_int, 0..39).
+# A board is (hands, table) where hands is a tuple of per-player tuples.
+
+NUM_CARDS = len(Card.RANKS) * len(Card.SUITS)
+
+CARD_VALUES = tuple(Card.VALUES[rank] for rank in Card.RANKS for _ in Card.SUITS)
+HAYA_INT = HAYA.to_int()
+
+# Cards that score the same way are interchangeable for the search: same value,
+# same diamond count, and the 7D/7C keep a class of their own.
+CARD_CLASSES = tuple(
+    -1 - c if c in (HAYA_INT, DINARI.to_int()) else CARD_VALUES[c] * 2 + CARD_BY_INT[c]._is_diamond
+    for c in range(NUM_CARDS)
+)
+
+LEGAL_MOVES_CACHE_SIZE = 100000
+
+# Per-move facts shared by move ordering and evaluation. Field order matters:
+# tags compare as tuples, most important criterion first.
+MoveTag = namedtuple('MoveTag', 'has_haya is_chkobba captured_value captured_len')
+
+
+def board_from_state(game_state) -> Tuple[Tuple[Tuple[int, ...], ...], Tuple[int, ...]]:
+    """Build the (hands, table) integer board for a GameState"""
+    hands = tuple(
+        tuple(c._int for c in hand)
+        for hand in game_state.hands
+    )
+    table = tuple(c._int for c in game_state.table)
+    return hands, table
+
+
+def legal_moves(hand: Tuple[int, ...], table: Tuple[int, ...]) -> Tuple[Tuple[int, Tuple[int, ...]], ...]:
+    """Integer counterpart of GameState.get_legal_moves
+    Sorting the cards first makes every ordering of the same hand and table share
+    one cache entry, so transpositions in the search skip the subset-sum work.
+    Moves that only swap cards of the same CARD_CLASSES class are kept once
+    (the first in sorted order); GameState.get_legal_moves still lists them all.
+    """
+    return _legal_moves_cached(tuple(sorted(hand)), tuple(sorted(table)))
+
+
+@lru_cache(maxsize=LEGAL_MOVES_CACHE_SIZE)
+def _legal_moves_cached(hand: Tuple[int, ...], table: Tuple[int, ...]) -> Tuple[Tuple[int, Tuple[int, ...]], ...]:
+    moves = []
+    values = tuple(CARD_VALUES[t] for t in table)
+    classes = tuple(CARD_CLASSES[t] for t in table)
+    can_skip = False
+    seen = set()
+
+    for card in hand:
+        # Singles if a 1-to-1 match exists, otherwise the sum captures (2 or more cards)
+        captures = capture_positions(values, CARD_VALUES[card])
+        card_class = CARD_CLASSES[card]
+        for positions in captures:
+            key = (card_class, tuple(sorted(classes[i] for i in positions)))
+            if key not in seen:
+                seen.add(key)
+                moves.append((card, tuple(table[i] for i in positions)))
+        if not captures:
+            can_skip = True
+
+    # Any card may be played without capturing unless every card in hand can capture
+    if can_skip:
+        played = set()
+        for card in hand:
+            if CARD_CLASSES[card] not in played:
+                played.add(CARD_CLASSES[card])
+                moves.append((card, ()))
+    return tuple(moves)
+
+
+def describe_move(captured: Tuple[int, ...], table_len: int) -> MoveTag:
+    """Scan a capture once and return its MoveTag"""
+    captured_len = len(captured)
+    return MoveTag(HAYA_INT in captured, captured_len > 0 and captured_len == table_len,
+                   sum(CARD_VALUES[c] for c in captured), captured_len)
+
+
+def apply_move(hands: Tuple[Tuple[int, ...], ...], table: Tuple[int, ...], player_idx: int,
+               card: int, captured: Tuple[int, ...]) -> Tuple[Tuple[Tuple[int, ...], ...], Tuple[int, ...]]:
+    """Return the (hands, table) board after player_idx plays card"""
+    hand = tuple(c for c in hands[player_idx] if c != card)
+    hands = hands[:player_idx] + (hand,) + hands[player_idx + 1:]
+
+    if captured:
+        table = tuple(c for c in table if c not in captured)
+    else:
+        table = table + (card,)
+
+    return hands, table
@@ -0,0 +1,27 @@
+"""Worker process for the hard AI search
+
+app.py starts these as separate interpreters running this script, so a worker only
+imports the game and AI modules: it never runs eventlet.monkey_patch() or builds
+the Flask app. Each request is a pickled (hands, table, player_idx, difficulty)
+tuple on stdin, answered with the pickled search_board_move result on stdout.
+"""
+import pickle
+import sys
+from ai import search_board_move
+
+
+def main():
+    requests, replies = sys.stdin.buffer, sys.stdout.buffer
+    sys.stdout = sys.stderr  # Stray prints must not corrupt the reply stream
+
+    while True:
+        try:
+            request = pickle.load(requests)
+        except EOFError:
+            return  # app.py closed the pipe
+        pickle.dump(search_board_move(*request), replies, pickle.HIGHEST_PROTOCOL)
+        replies.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,30 @@
+import eventlet
+eventlet.monkey_patch()  # Must run before anything imports socket/threading
+
 import os
+import random
+import string
+import sqlite3
 import uuid
-import json
 import time
+import heapq
 import threading
+import pickle
+import queue
+import subprocess
+import sys
+from dataclasses import dataclass, field
 from datetime import datetime
+from typing import Dict, List, Optional
+import orjson
 from flask import Flask, render_template, request, jsonify, session
+from flask.json.provider import JSONProvider
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from config import Config, config
-from db import db
-from game_logic import GameState, Card
+from db import get_db, session_game_state
+from game_logic import GameState, CARD_BY_CODE, CARD_BY_INT, card_mask, single_winner
 from ai import AIPlayer
+from ai_kernel import board_from_state
 import logging
 
 # Configure logging
@@ -19,30 +34,75 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson (int dict keys are stringified like stdlib json)"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+class OrjsonSerializer:
+    """json-module-compatible orjson wrapper for Socket.IO packet encoding"""
+    
+    @staticmethod
+    def dumps(obj, *args, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+    
+    @staticmethod
+    def loads(s, *args, **kwargs):
+        return orjson.loads(s)
+
+
 # Initialize Flask app
 app = Flask(__name__)
 app.config.from_object(config.get(os.environ.get('FLASK_ENV', 'development')))
 app.config['SECRET_KEY'] = app.config['SECRET_KEY']
+app.json = OrjsonProvider(app)
 
 # Initialize SocketIO
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=app.config['SOCKETIO_ASYNC_MODE'],
+                    json=OrjsonSerializer)
+
+
+@dataclass
+class RoomState:
+    """In-memory state of one room, so handlers fetch everything with a single lookup"""
+    game: Optional[GameState] = None
+    players: List[int] = field(default_factory=list)  # player_ids (ordered by join)
+    index_of: Dict[int, int] = field(default_factory=dict)  # player_id -> game_index
+    ai_players: Dict[int, AIPlayer] = field(default_factory=dict)  # game_index -> AIPlayer, kept for the whole game
+    room_row: Optional[dict] = None  # game_rooms row, dropped when the status changes
+    players_rows: Optional[List[dict]] = None  # game_players rows, dropped on join/reconnect
+    player_names: List[str] = field(default_factory=list)  # game_index -> player_name
+    player_list: Optional[List[dict]] = None  # player_list payload, dropped on join
+    player_mapping: Optional[Dict[str, int]] = None  # player_mapping payload, dropped on join
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)  # Guards game moves
+    pending_broadcasts: List[dict] = field(default_factory=list)  # card_played payloads not yet sent
+    turn_gen: int = 0  # Bumped to cancel the pending turn timeout
+    ai_running: bool = False  # An AI chain task is playing this room
+    target_score: int = 21  # 11 or 21
+
+
+ROOM_CODE_CHARS = string.ascii_uppercase + string.digits
 
 # In-memory game sessions
-active_games = {}  # room_id -> GameState
+rooms = {}  # room_id -> RoomState
 active_sessions = {}  # session_token -> {room_id, player_id, socket_id, game_index}
-room_players = {}  # room_id -> [player_ids] (ordered by join)
-player_id_to_index = {}  # room_id -> {player_id: game_index}
-ai_players = {}  # room_id -> {player_index: AIPlayer}
-turn_timers = {}  # room_id -> timer_thread
-room_settings = {}  # room_id -> {target_score: 11 or 21}
+sid_to_token = {}  # socket sid -> session_token, for disconnect cleanup
+token_to_player = {}  # session_token -> game_players row (dict)
+timeout_heap = []  # (deadline, room_id, turn_gen) turn timeouts, earliest first
+timeout_scheduler_started = False
+ai_workers = queue.Queue()  # Idle AIWorker processes
+ai_worker_count = 0  # AIWorker processes started, busy or idle
 
 
 def generate_room_code(length=6):
     """Generate random room code"""
-    import random
-    import string
-    chars = string.ascii_uppercase + string.digits
-    return ''.join(random.choice(chars) for _ in range(length))
+    return ''.join(random.choices(ROOM_CODE_CHARS, k=length))
 
 
 def generate_session_token():
@@ -50,49 +110,163 @@ def generate_session_token():
     return str(uuid.uuid4())
 
 
+def get_room_state(room_id):
+    """Get the in-memory state of a room, creating an empty one if needed
+    Only for paths that populate a room (join and game start); lookups use rooms.get
+    so a closed room is not brought back.
+    """
+    state = rooms.get(room_id)
+    if state is None:
+        state = rooms[room_id] = RoomState()
+    return state
+
+
+def get_target_score(room_id):
+    """Get a room's target score, or the default once the room is gone"""
+    state = rooms.get(room_id)
+    return state.target_score if state else RoomState.target_score
+
+
+def get_game(room_id):
+    """Get the active GameState of a room, if any"""
+    state = rooms.get(room_id)
+    return state.game if state else None
+
+
+def get_room(room_id):
+    """Get room row, cached in memory until its status changes"""
+    state = rooms.get(room_id)
+    if state is None or state.room_row is None:
+        row = get_db().get_room_by_id(room_id)
+        if row is None:
+            return None
+        if state is None:
+            return row._asdict()  # Not cached: a room without in-memory state stays that way
+        state.room_row = row._asdict()
+    return state.room_row
+
+
+def get_room_players(room_id):
+    """Get player rows for a room, cached in memory until a player joins or reconnects"""
+    state = rooms.get(room_id)
+    if state is None:
+        return [p._asdict() for p in get_db().get_players_by_room(room_id)]
+    if state.players_rows is None:
+        state.players_rows = [p._asdict() for p in get_db().get_players_by_room(room_id)]
+    return state.players_rows
+
+
+def set_room_status(room_id, status):
+    """Update room status; the cached row is patched since the DB write is queued"""
+    room = get_room(room_id)
+    if room is not None:
+        room['status'] = status
+    get_db().update_room_status(room_id, status)
+
+
+def invalidate_room_players(room_id):
+    """Drop the cached player rows of a room"""
+    state = rooms.get(room_id)
+    if state:
+        state.players_rows = None
+
+
+def queue_card_played(room_id, payload):
+    """Queue a card_played payload until the turn passes back to a human"""
+    state = rooms.get(room_id)
+    if state:
+        state.pending_broadcasts.append(payload)
+
+
+def flush_broadcasts(room_id):
+    """Send queued moves: a lone move as card_played, a burst as one moves_batch"""
+    state = rooms.get(room_id)
+    if not state or not state.pending_broadcasts:
+        return
+    
+    moves, state.pending_broadcasts = state.pending_broadcasts, []
+    if len(moves) == 1:
+        socketio.emit('card_played', moves[0], room=f'room_{room_id}')
+    else:
+        socketio.emit('moves_batch', {'moves': moves}, room=f'room_{room_id}')
+
+
+def get_player_list(room_id):
+    """Get the [{id, name, is_ai}] payload for a room, built once per set of players"""
+    state = rooms.get(room_id)
+    if state is None or state.player_list is None:
+        player_list = [
+            {'id': p['id'], 'name': p['player_name'], 'is_ai': bool(p['is_ai'])}
+            for p in get_room_players(room_id)
+        ]
+        if state is None:
+            return player_list
+        state.player_list = player_list
+    return state.player_list
+
+
+def get_player_mapping(room_id):
+    """Get the {player_id: game_index} payload; keys are pre-stringified as JSON needs them"""
+    state = rooms.get(room_id)
+    if state is None:
+        return {}
+    if state.player_mapping is None:
+        state.player_mapping = {str(pid): idx for pid, idx in state.index_of.items()}
+    return state.player_mapping
+
+
+def remember_player_token(session_token, player_id, room_id, player_name, is_ai=False):
+    """Record a newly added player so token lookups skip the DB"""
+    token_to_player[session_token] = {
+        'id': player_id, 'room_id': room_id, 'player_name': player_name,
+        'is_ai': is_ai, 'session_token': session_token
+    }
+
+
+def get_player_by_token(session_token):
+    """Get player row by session token, from memory when possible"""
+    player = token_to_player.get(session_token)
+    if player is None:
+        row = get_db().get_player_by_token(session_token)
+        if row is None:
+            return None
+        player = token_to_player[session_token] = row._asdict()
+    return player
+
+
 def get_player_game_index(room_id, player_id):
     """Get player's index in game state array"""
-    if room_id not in player_id_to_index:
+    state = rooms.get(room_id)
+    if state is None:
         return None
-    return player_id_to_index[room_id].get(player_id)
+    return state.index_of.get(player_id)
 
 
 def is_ai_player(room_id, player_index):
-    """Check if player at index is AI"""
-    if room_id not in room_players or player_index >= len(room_players[room_id]):
-        return False
-    
-    player_id = room_players[room_id][player_index]
-    player = db.get_player_by_id(player_id)
-    return bool(player and player['is_ai'])
+    """Check if player at index is AI
+    Every AI seat gets its AIPlayer when it is added to the room, so this needs no DB lookup.
+    """
+    state = rooms.get(room_id)
+    return state is not None and player_index in state.ai_players
 
 
-def get_scoring_details(game_state, player_idx):
-    """Get detailed scoring breakdown for a player"""
-    player = game_state.players[player_idx]
-    round_captures = player.get('round_captures', [])
-    
-    # Count cards and diamonds
-    total_cards = len(round_captures)
-    diamond_count = sum(1 for c in round_captures if c.suit == 'D')
-    
-    # Check for special cards
-    has_haya = any(c.rank == '7' and c.suit == 'D' for c in round_captures)
-    has_dinari = any(c.rank == '7' and c.suit == 'C' for c in round_captures)
+def get_scoring_details(game_state, player_idx, all_card_counts, all_diamond_counts):
+    """Get detailed scoring breakdown for a player
+    all_card_counts/all_diamond_counts hold every player's round totals, computed once by the caller.
+    """
+    total_cards = all_card_counts[player_idx]
+    diamond_count = all_diamond_counts[player_idx]
     
     # Determine if has most cards/diamonds
-    all_card_counts = [len(p.get('round_captures', [])) for p in game_state.players]
-    all_diamond_counts = [sum(1 for c in p.get('round_captures', []) if c.suit == 'D') for p in game_state.players]
-    
-    has_most_cards = total_cards == max(all_card_counts) and all_card_counts.count(total_cards) == 1 and total_cards >= 21
-    has_most_diamonds = diamond_count == max(all_diamond_counts) and all_diamond_counts.count(diamond_count) == 1 and diamond_count > 0
+    has_most_cards = single_winner(all_card_counts, 21) == player_idx
+    has_most_diamonds = single_winner(all_diamond_counts, 1) == player_idx
     
     return {
         'most_cards': has_most_cards,
         'most_diamonds': has_most_diamonds,
-        'haya': has_haya,
-        'dinari': has_dinari,
-        'chkobba_count': player.get('chkobba_count', 0),
+        'haya': game_state.has_haya[player_idx],
+        'dinari': game_state.has_dinari[player_idx],
+        'chkobba_count': game_state.chkobba_counts[player_idx],
         'total_cards': total_cards,
         'diamond_count': diamond_count
     }
@@ -100,43 +274,41 @@ def get_scoring_details(game_state, player_idx):
 
 def check_round_end(room_id):
     """Check if round has ended and emit round_ended event"""
-    game_state = active_games.get(room_id)
+    game_state = get_game(room_id)
     if not game_state:
         return
     
     # Check if round is over (deck empty and all hands empty)
-    all_hands_empty = all(len(p['hand']) == 0 for p in game_state.players)
+    all_hands_empty = game_state._cards_in_hands == 0
     deck_empty = game_state.deck.remaining() == 0
     
     if all_hands_empty and deck_empty:
         logger.info(f"Round {game_state.round_number} ended in room {room_id}")
+        flush_broadcasts(room_id)
         
         # Calculate round scores
         round_scores = game_state.end_round()
         
         # Get player names
-        players_data = db.get_players_by_room(room_id)
-        player_names = {}
-        for p in players_data:
-            player_idx = get_player_game_index(room_id, p['id'])
-            if player_idx is not None:
-                player_names[player_idx] = p['player_name']
+        player_names = dict(enumerate(rooms[room_id].player_names))
         
         # Get detailed scoring breakdown
+        all_card_counts = [len(cards) for cards in game_state.round_captures]
+        all_diamond_counts = game_state.diamond_counts
         scoring_details = {}
         for idx in range(game_state.num_players):
-            scoring_details[idx] = get_scoring_details(game_state, idx)
+            scoring_details[idx] = get_scoring_details(game_state, idx, all_card_counts, all_diamond_counts)
         
         # Get total scores
-        total_scores = {i: p['score'] for i, p in enumerate(game_state.players)}
+        total_scores = dict(enumerate(game_state.scores))
         
         # Get target score
-        target_score = room_settings.get(room_id, {}).get('target_score', 21)
+        target_score = get_target_score(room_id)
         
         # Emit round ended event
         socketio.emit('round_ended', {
             'round_number': game_state.round_number - 1,  # Previous round number
-            'round_scores': round_scores,
+            'round_scores': dict(enumerate(round_scores)),
             'total_scores': total_scores,
             'scoring_details': scoring_details,
             'player_names': player_names,
@@ -148,14 +320,117 @@ def check_round_end(room_id):
     return False
 
 
+AI_WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ai_worker.py')
+
+
+class AIWorker:
+    """One ai_worker.py process running the hard search
+    It is a fresh interpreter that never imports this module, so it has none of the
+    eventlet patching or Flask setup. Its pipes come from the monkey-patched subprocess
+    module, so waiting for a reply only suspends the calling green thread.
+    """
+    
+    def __init__(self):
+        self.process = subprocess.Popen([sys.executable, AI_WORKER_SCRIPT],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    
+    def search(self, hands, table, player_idx, difficulty):
+        pickle.dump((hands, table, player_idx, difficulty), self.process.stdin, pickle.HIGHEST_PROTOCOL)
+        self.process.stdin.flush()
+        return pickle.load(self.process.stdout)
+    
+    def close(self):
+        self.process.kill()
+        self.process.wait()
+
+
+def acquire_ai_worker():
+    """Take an idle AI worker, starting one while fewer than AI_POOL_WORKERS exist
+    Otherwise waits (green) for a busy one to come back through release_ai_worker.
+    """
+    global ai_worker_count
+    if ai_workers.empty() and ai_worker_count < Config.AI_POOL_WORKERS:
+        worker = AIWorker()
+        ai_worker_count += 1  # Counted once started, so a failed start does not use up a slot
+        return worker
+    return ai_workers.get()
+
+
+def release_ai_worker(worker):
+    ai_workers.put(worker)
+
+
+def replace_ai_worker():
+    """Start a worker in place of one that failed, or give up its slot if that fails too"""
+    global ai_worker_count
+    try:
+        return AIWorker()
+    except OSError:
+        logger.error("Could not restart AI worker", exc_info=True)
+        ai_worker_count -= 1
+        return None
+
+
+def choose_ai_move(ai, game_state, player_idx):
+    """Choose the AI's move; the hard search runs in an AI worker process so it doesn't
+    hold the GIL while other rooms are served. Easy and medium are cheap enough to run here.
+    """
+    if ai.difficulty != 'hard':
+        return ai.choose_move(game_state, player_idx)
+    
+    hands, table = board_from_state(game_state)
+    try:
+        worker = acquire_ai_worker()
+    except OSError:
+        logger.error("Could not start AI worker, searching in-process", exc_info=True)
+        return ai.choose_move(game_state, player_idx)
+    try:
+        move = worker.search(hands, table, player_idx, ai.difficulty)
+    except (EOFError, OSError, pickle.UnpicklingError):
+        logger.error("AI worker failed, replacing it", exc_info=True)
+        worker.close()
+        worker = replace_ai_worker()
+        move = None
+    finally:
+        if worker is not None:
+            release_ai_worker(worker)
+    
+    if move is None:
+        return ai.choose_move(game_state, player_idx)
+    card, captured = move
+    return CARD_BY_INT[card], [CARD_BY_INT[c] for c in captured]
+
+
 def trigger_ai_turn(room_id):
-    """Trigger AI player to make a move"""
-    def ai_move():
-        time.sleep(0.5)  # 500ms think time
+    """Trigger AI player to make a move
+    One task plays the whole chain of AI turns, so a second trigger while it runs is a no-op.
+    """
+    state = rooms.get(room_id)
+    if state is None or state.ai_running:
+        return
+    state.ai_running = True
+    socketio.start_background_task(run_ai_turn, room_id)
+
+
+def run_ai_turn(room_id):
+    """Play AI turns in a background task until a human player is up"""
+    try:
+        _play_ai_turns(room_id)
+    finally:
+        state = rooms.get(room_id)
+        if state:
+            state.ai_running = False
+        flush_broadcasts(room_id)  # Don't strand queued moves if the chain stops early
+
+
+def _play_ai_turns(room_id):
+    while True:
+        socketio.sleep(Config.AI_THINK_TIME_MS / 1000)  # Think time, yields to other rooms
         
-        game_state = active_games.get(room_id)
-        if not game_state:
+        state = rooms.get(room_id)
+        if not state or not state.game:
             return
+        game_state = state.game
         
         current_player_idx = game_state.current_player
         
@@ -164,81 +439,123 @@ def trigger_ai_turn(room_id):
             return
         
         # Get AI player instance
-        if room_id not in ai_players or current_player_idx not in ai_players[room_id]:
+        ai = state.ai_players.get(current_player_idx)
+        if ai is None:
             logger.error(f"AI player not found for room {room_id} index {current_player_idx}")
             return
         
-        ai = ai_players[room_id][current_player_idx]
-        
         # Choose move
         try:
-            card, captured = ai.choose_move(game_state, current_player_idx)
+            card, captured = choose_ai_move(ai, game_state, current_player_idx)
             
             if card is None:
                 logger.error(f"AI could not find valid move")
                 return
             
-            # Play the card
-            result = game_state.play_card(current_player_idx, card, captured)
-            
-            if result['success']:
+            with state.lock:
+                # Play the card
+                result = game_state.apply_and_diff(current_player_idx, card, captured)
+                
+                if not result['success']:
+                    logger.error(f"AI move failed: {result['message']}")
+                    return
+                
                 # Get player_id for database
-                player_id = room_players[room_id][current_player_idx]
+                player_id = state.players[current_player_idx]
                 
                 # Update database
-                db.record_move(room_id, game_state.round_number, player_id,
-                              card.code, [c.code for c in captured], 
-                              result['is_chkobba'], result['is_haya'])
+                get_db().record_move(room_id, game_state.round_number, player_id,
+                                     card._int, card_mask(captured),
+                                     result['is_chkobba'], result['is_haya'])
                 
                 # Check if round ended before moving to next turn
-                round_ended = check_round_end(room_id)
+                if check_round_end(room_id):
+                    return
+                
+                # Move to next turn
+                game_state.next_turn()
+                
+                # Queue for the room; sent once a human is up
+                queue_card_played(room_id, {
+                    'player_id': player_id,
+                    'player_index': current_player_idx,
+                    'card': card.code,
+                    'captured': [c.code for c in captured],
+                    'is_chkobba': result['is_chkobba'],
+                    'is_haya': result['is_haya'],
+                    'new_cards_dealt': result.get('new_cards_dealt', False),
+                    'next_turn_player': game_state.current_player,
+                    'diff': result['diff']
+                })
                 
-                if not round_ended:
-                    # Move to next turn
-                    game_state.next_turn()
-                    
-                    # Broadcast to room
-                    socketio.emit('card_played', {
-                        'player_id': player_id,
-                        'player_index': current_player_idx,
-                        'card': card.code,
-                        'captured': [c.code for c in captured],
-                        'is_chkobba': result['is_chkobba'],
-                        'is_haya': result['is_haya'],
-                        'new_cards_dealt': result.get('new_cards_dealt', False),
-                        'next_turn_player': game_state.current_player,
-                        'game_state': game_state.to_dict()
-                    }, room=f'room_{room_id}')
-                    
-                    logger.info(f"AI player {current_player_idx} played {card.code}")
-                    
-                    # Process next turn (might be another AI)
-                    process_next_turn(room_id)
-            else:
-                logger.error(f"AI move failed: {result['message']}")
+                logger.info(f"AI player {current_player_idx} played {card.code}")
         
         except Exception as e:
             logger.error(f"AI move error: {str(e)}", exc_info=True)
-    
-    # Run AI move in background thread
-    threading.Thread(target=ai_move, daemon=True).start()
-
-
-def start_turn_timer(room_id):
-    """Start timeout timer for current turn"""
-    def timeout_handler():
-        time.sleep(10)  # 10 second timeout
-        
-        game_state = active_games.get(room_id)
-        if not game_state:
             return
         
-        # CRITICAL: Don't trigger if game hasn't started or is finished
-        room = db.get_room_by_id(room_id)
-        if room['status'] != 'started':
-            logger.info(f"Timer cancelled - game not started in room {room_id}")
+        # Keep looping while the next player is also AI; otherwise hand over
+        if game_state.is_finished or not is_ai_player(room_id, game_state.current_player):
+            process_next_turn(room_id)
             return
-        
+
+
+def start_turn_timer(room_id):
+    """Start timeout timer for current turn
+    Timers are entries in timeout_heap; starting a new one (or bumping turn_gen) cancels the old one.
+    """
+    global timeout_scheduler_started
+    
+    # Cancel existing timer if any
+    state = rooms.get(room_id)
+    if state is None:
+        return
+    state.turn_gen += 1
+    
+    # CRITICAL: Only start timer if game has actually started
+    room = get_room(room_id)
+    if room['status'] != 'started':
+        logger.info(f"Skipping timer start - game not started yet in room {room_id}")
+        return
+    
+    # Start new timer
+    heapq.heappush(timeout_heap, (time.monotonic() + Config.DEFAULT_TIMEOUT_SECONDS, room_id, state.turn_gen))
+    if not timeout_scheduler_started:
+        timeout_scheduler_started = True
+        socketio.start_background_task(timeout_scheduler)
+    logger.info(f"Started turn timer for room {room_id}")
+
+
+def timeout_scheduler():
+    """Single background task firing expired turn timeouts for every room"""
+    while True:
+        socketio.sleep(Config.TIMEOUT_POLL_INTERVAL)
+        now = time.monotonic()
+        while timeout_heap and timeout_heap[0][0] <= now:
+            _, room_id, turn_gen = heapq.heappop(timeout_heap)
+            state = rooms.get(room_id)
+            if not state or state.turn_gen != turn_gen:
+                continue  # Cancelled: the turn moved on or the room closed
+            try:
+                handle_turn_timeout(room_id)
+            except Exception as e:
+                logger.error(f"Turn timeout error: {str(e)}", exc_info=True)
+
+
+def handle_turn_timeout(room_id):
+    """Auto-play for a human player whose turn timed out"""
+    state = rooms.get(room_id)
+    if not state or not state.game:
+        return
+    game_state = state.game
+    
+    # CRITICAL: Don't trigger if game hasn't started or is finished
+    room = get_room(room_id)
+    if room['status'] != 'started':
+        logger.info(f"Timer cancelled - game not started in room {room_id}")
+        return
+    
+    with state.lock:
         current_player_idx = game_state.current_player
         
         # Don't auto-play for AI (they have their own trigger)
@@ -248,18 +565,18 @@ def start_turn_timer(room_id):
         logger.info(f"Timeout for player {current_player_idx} in room {room_id} - auto-playing")
         
         # Auto-play: play first card with no captures
-        hand = game_state.players[current_player_idx]['hand']
+        hand = game_state.hands[current_player_idx]
         if not hand:
             return
         
         card = hand[0]
-        result = game_state.play_card(current_player_idx, card, [])
+        result = game_state.apply_and_diff(current_player_idx, card, [])
         
         if result['success']:
-            player_id = room_players[room_id][current_player_idx]
+            player_id = state.players[current_player_idx]
             
-            db.record_move(room_id, game_state.round_number, player_id,
-                          card.code, [], result['is_chkobba'], result['is_haya'])
+            get_db().record_move(room_id, game_state.round_number, player_id,
+                                 card._int, 0, result['is_chkobba'], result['is_haya'])
             
             # Check if round ended
             round_ended = check_round_end(room_id)
@@ -267,7 +584,7 @@ def start_turn_timer(room_id):
             if not round_ended:
                 game_state.next_turn()
                 
-                socketio.emit('card_played', {
+                queue_card_played(room_id, {
                     'player_id': player_id,
                     'player_index': current_player_idx,
                     'card': card.code,
@@ -276,59 +593,48 @@ def start_turn_timer(room_id):
                     'is_haya': result['is_haya'],
                     'new_cards_dealt': result.get('new_cards_dealt', False),
                     'next_turn_player': game_state.current_player,
-                    'game_state': game_state.to_dict(),
+                    'diff': result['diff'],
                     'auto_played': True
-                }, room=f'room_{room_id}')
+                })
                 
                 logger.info(f"Auto-played for player {current_player_idx}")
                 
                 # Process next turn
                 process_next_turn(room_id)
-    
-    # Cancel existing timer if any
-    if room_id in turn_timers:
-        turn_timers[room_id].cancel()
-    
-    # CRITICAL: Only start timer if game has actually started
-    room = db.get_room_by_id(room_id)
-    if room['status'] != 'started':
-        logger.info(f"Skipping timer start - game not started yet in room {room_id}")
-        return
-    
-    # Start new timer
-    timer = threading.Timer(10.0, timeout_handler)
-    timer.daemon = True
-    timer.start()
-    turn_timers[room_id] = timer
-    logger.info(f"Started turn timer for room {room_id}")
 
 
 def process_next_turn(room_id):
     """Process turn change and trigger AI/timer as needed"""
-    game_state = active_games.get(room_id)
+    game_state = get_game(room_id)
     if not game_state:
         return
     
     # CRITICAL: Only process turns if game has started
-    room = db.get_room_by_id(room_id)
+    room = get_room(room_id)
     if room['status'] != 'started':
         logger.info(f"Skipping turn processing - game not started in room {room_id}")
+        flush_broadcasts(room_id)
         return
     
     current_player_idx = game_state.current_player
     
     # Check if game ended
     if game_state.is_finished:
+        flush_broadcasts(room_id)
         socketio.emit('game_ended', {
             'winner_id': game_state.winner,
-            'final_scores': {i: p['score'] for i, p in enumerate(game_state.players)}
+            'final_scores': dict(enumerate(game_state.scores))
         }, room=f'room_{room_id}')
         return
     
-    # If current player is AI, trigger AI move
+    # If current player is AI, trigger AI move. The AI chain only calls this once a
+    # human is up, so anything queued here is a human's move and goes out now;
+    # only the AI moves that follow are coalesced into one moves_batch
     if is_ai_player(room_id, current_player_idx):
+        flush_broadcasts(room_id)
         trigger_ai_turn(room_id)
     else:
+        flush_broadcasts(room_id)
         # Start timeout timer for human player
         start_turn_timer(room_id)
 
@@ -364,33 +670,42 @@ def create_room():
     if target_score not in [11, 21]:
         return jsonify({'error': 'Target score must be 11 or 21'}), 400
     
-    room_code = generate_room_code()
-    while db.get_room_by_code(room_code):
-        room_code = generate_room_code()
-    
-    room_id = db.create_room(room_code, player_name, game_mode, num_players)
-    session_token = generate_session_token()
-    player_id = db.add_player(room_id, player_name, is_ai=False, session_token=session_token)
-    
-    active_games[room_id] = GameState(num_players)
-    room_players[room_id] = [player_id]
-    player_id_to_index[room_id] = {player_id: 0}
-    ai_players[room_id] = {}
-    room_settings[room_id] = {'target_score': target_score}
-    
-    if 'ai' in game_mode.lower():
-        ai_difficulty = 'medium'
-        ai_count = num_players - 1
+    # One transaction for the room and all its seats
+    with get_db().transaction():
+        # room_code is UNIQUE, so a collision fails the insert; retry instead of probing first
+        room_id = None
+        while room_id is None:
+            room_code = generate_room_code()
+            try:
+                room_id = get_db().create_room(room_code, player_name, game_mode, num_players)
+            except sqlite3.IntegrityError:
+                logger.info(f"Room code {room_code} already taken, generating another")
+        
+        session_token = generate_session_token()
+        seats = [{'name': player_name, 'is_ai': False, 'token': session_token}]
         
-        for i in range(ai_count):
-            ai_name = f"AI-Bot-{i+1}"
-            ai_player_id = db.add_player(room_id, ai_name, is_ai=True, 
-                                         ai_difficulty=ai_difficulty, session_token=None)
-            room_players[room_id].append(ai_player_id)
-            player_id_to_index[room_id][ai_player_id] = i + 1
-            ai_players[room_id][i + 1] = AIPlayer(ai_difficulty)
+        is_ai_game = 'ai' in game_mode.lower()
+        if is_ai_game:
+            ai_difficulty = 'medium'
+            ai_count = num_players - 1
+            seats.extend({'name': f"AI-Bot-{i+1}", 'is_ai': True, 'diff': ai_difficulty}
+                         for i in range(ai_count))
         
-        logger.info(f"Created AI game room {room_code} with {ai_count} AI players")
+        # The host and every AI seat go in with one executemany
+        player_ids = get_db().add_players_bulk(room_id, seats)
+        player_id = player_ids[0]
+        remember_player_token(session_token, player_id, room_id, player_name)
+        
+        state = rooms[room_id] = RoomState(game=GameState(num_players), players=player_ids,
+                                           index_of={pid: i for i, pid in enumerate(player_ids)},
+                                           player_names=[seat['name'] for seat in seats],
+                                           target_score=target_score)
+        
+        if is_ai_game:
+            for i in range(1, len(seats)):
+                state.ai_players[i] = AIPlayer(ai_difficulty)
+            
+            logger.info(f"Created AI game room {room_code} with {ai_count} AI players")
     
     logger.info(f"Created room {room_code} (ID: {room_id}) with player {player_name}, target score: {target_score}")
     
@@ -401,7 +716,7 @@ def create_room():
         'player_index': 0,
         'session_token': session_token,
         'target_score': target_score,
-        'status': 'ready' if 'ai' in game_mode.lower() else 'waiting'
+        'status': 'ready' if is_ai_game else 'waiting'
     })
 
 @app.route('/api/room/join', methods=['POST'])
@@ -414,12 +729,12 @@ def join_room_endpoint():
     if not room_code or not player_name:
         return jsonify({'error': 'Missing room code or player name'}), 400
     
-    room = db.get_room_by_code(room_code)
+    room = get_db().get_room_by_code(room_code)
     if not room:
         return jsonify({'error': 'Room not found'}), 404
     
     room_id = room['id']
-    player_count = db.get_player_count(room_id)
+    player_count = get_db().get_player_count(room_id)
     
     if player_count >= room['num_players']:
         return jsonify({'error': 'Room is full'}), 400
@@ -429,24 +744,23 @@ def join_room_endpoint():
     
     is_ai = ai_difficulty is not None
     session_token = generate_session_token()
-    player_id = db.add_player(room_id, player_name, is_ai=is_ai, 
+    player_id = get_db().add_player(room_id, player_name, is_ai=is_ai, 
                              ai_difficulty=ai_difficulty, session_token=session_token)
+    remember_player_token(session_token, player_id, room_id, player_name, is_ai)
     
-    if room_id not in room_players:
-        room_players[room_id] = []
-    if room_id not in player_id_to_index:
-        player_id_to_index[room_id] = {}
-    if room_id not in ai_players:
-        ai_players[room_id] = {}
+    state = get_room_state(room_id)
+    state.players_rows = state.player_list = state.player_mapping = None
     
-    game_index = len(room_players[room_id])
-    room_players[room_id].append(player_id)
-    player_id_to_index[room_id][player_id] = game_index
+    game_index = len(state.players)
+    state.players.append(player_id)
+    state.player_names.append(player_name)
+    state.index_of[player_id] = game_index
     
     if is_ai:
-        ai_players[room_id][game_index] = AIPlayer(ai_difficulty)
+        state.ai_players[game_index] = AIPlayer(ai_difficulty)
     
-    players = db.get_players_by_room(room_id)
+    # Built once and cached, so handle_join_game reuses it too
+    player_list = get_player_list(room_id)
     
     # FIXED: Emit to room AFTER player joins (they'll receive it via socket)
     # NOTE: This will be received by all players already in the room via WebSocket
@@ -457,11 +771,8 @@ def join_room_endpoint():
             'name': player_name,
             'is_ai': is_ai
         },
-        'players': [
-            {'id': p['id'], 'name': p['player_name'], 'is_ai': bool(p['is_ai'])}
-            for p in players
-        ],
-        'total_players': len(players),
+        'players': player_list,
+        'total_players': len(player_list),
         'required_players': room['num_players']
     }, room=f'room_{room_id}')
     
@@ -472,29 +783,26 @@ def join_room_endpoint():
         'player_id': player_id,
         'player_index': game_index,
         'session_token': session_token,
-        'players': [
-            {'id': p['id'], 'name': p['player_name'], 'is_ai': bool(p['is_ai'])}
-            for p in players
-        ],
+        'players': player_list,
         'status': 'joined'
     })
 
 @app.route('/api/room/<room_code>', methods=['GET'])
 def get_room_status(room_code):
-    room = db.get_room_by_code(room_code.upper())
+    room = get_db().get_room_by_code(room_code.upper())
     if not room:
         return jsonify({'error': 'Room not found'}), 404
     
     room_id = room['id']
-    players = db.get_players_by_room(room_id)
-    game_session = db.get_game_session(room_id)
+    players = get_room_players(room_id)
+    game_session = get_db().get_game_session(room_id)
     
     return jsonify({
         'room_code': room_code.upper(),
         'status': room['status'],
         'game_mode': room['game_mode'],
         'num_players': room['num_players'],
-        'target_score': room_settings.get(room_id, {}).get('target_score', 21),
+        'target_score': get_target_score(room_id),
         'players': [
             {
                 'id': p['id'],
@@ -504,7 +812,7 @@ def get_room_status(room_code):
             }
             for p in players
         ],
-        'game_state': json.loads(game_session['game_state']) if game_session else None
+        'game_state': session_game_state(game_session) if game_session else None
     })
 
 @app.route('/api/room/reconnect', methods=['POST'])
@@ -515,15 +823,17 @@ def reconnect():
     if not session_token:
         return jsonify({'error': 'Missing session token'}), 400
     
-    player = db.get_player_by_token(session_token)
+    player = get_player_by_token(session_token)
     if not player:
         return jsonify({'error': 'Invalid session token'}), 401
     
     room_id = player['room_id']
-    room = db.get_room_by_id(room_id)
+    room = get_room(room_id)
     player_index = get_player_game_index(room_id, player['id'])
+    game_state = get_game(room_id)
     
-    db.update_player_status(player['id'], 'connected')
+    get_db().update_player_status(player['id'], 'connected')
+    invalidate_room_players(room_id)
     
     logger.info(f"Player {player['player_name']} reconnected to room {room['room_code']}")
     
@@ -532,14 +842,14 @@ def reconnect():
         'room_id': room_id,
         'player_id': player['id'],
         'player_index': player_index,
-        'target_score': room_settings.get(room_id, {}).get('target_score', 21),
-        'game_state': active_games.get(room_id).to_dict() if room_id in active_games else None,
+        'target_score': get_target_score(room_id),
+        'game_state': game_state.to_dict() if game_state else None,
         'status': 'reconnected'
     })
 
 @app.route('/api/settings/theme', methods=['GET'])
 def get_theme():
-    settings = db.get_settings()
+    settings = get_db().get_settings()
     return jsonify({
         'card_theme': settings['card_theme'],
         'board_theme': settings['board_theme']
@@ -551,12 +861,12 @@ def set_theme():
     card_theme = data.get('card_theme')
     board_theme = data.get('board_theme')
     
-    db.update_settings(card_theme=card_theme, board_theme=board_theme)
+    get_db().update_settings(card_theme=card_theme, board_theme=board_theme)
     return jsonify({'status': 'ok'})
 
 @app.route('/api/settings', methods=['GET'])
 def get_settings():
-    settings = db.get_settings()
+    settings = get_db().get_settings()
     return jsonify({
         'card_theme': settings['card_theme'],
         'board_theme': settings['board_theme'],
@@ -574,13 +884,19 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     logger.info(f"Client disconnected: {request.sid}")
+    
+    # Drop the session unless the player already rejoined from another socket
+    session_token = sid_to_token.pop(request.sid, None)
+    session_info = active_sessions.get(session_token)
+    if session_info and session_info['socket_id'] == request.sid:
+        del active_sessions[session_token]
 
 @socketio.on('join_game')
 def handle_join_game(data):
     room_code = data.get('room_code')
     session_token = data.get('session_token')
     
-    player = db.get_player_by_token(session_token)
+    player = get_player_by_token(session_token)
     if not player:
         emit('error', {'message': 'Invalid session token'})
         return
@@ -597,11 +913,12 @@ def handle_join_game(data):
         'game_index': player_index,
         'socket_id': request.sid
     }
+    sid_to_token[request.sid] = session_token
     
-    players = db.get_players_by_room(room_id)
-    room = db.get_room_by_id(room_id)
+    player_list = get_player_list(room_id)
+    room = get_room(room_id)
     
-    game_state = active_games.get(room_id)
+    game_state = get_game(room_id)
     if game_state:
         emit('game_state_update', {
             'game_state': game_state.to_dict(),
@@ -610,11 +927,8 @@ def handle_join_game(data):
     
     # Send complete player list to the joining player
     emit('player_list', {
-        'players': [
-            {'id': p['id'], 'name': p['player_name'], 'is_ai': bool(p['is_ai'])}
-            for p in players
-        ],
-        'total_players': len(players),
+        'players': player_list,
+        'total_players': len(player_list),
         'required_players': room['num_players']
     })
     
@@ -634,52 +948,55 @@ def handle_play_card(data):
     room_id = session_info['room_id']
     player_index = session_info['game_index']
     
+    state = rooms.get(room_id)
+    
     # Cancel turn timer
-    if room_id in turn_timers:
-        turn_timers[room_id].cancel()
+    if state:
+        state.turn_gen += 1
         logger.info(f"Cancelled timer for room {room_id}")
     
-    game_state = active_games.get(room_id)
-    if not game_state:
+    if not state or not state.game:
         emit('error', {'message': 'Game not found'})
         return
+    game_state = state.game
     
     try:
-        card = Card.from_code(card_code)
-        captured = [Card.from_code(c) for c in captured_codes]
-    except ValueError as e:
+        card = CARD_BY_CODE[card_code]
+        captured = [CARD_BY_CODE[c] for c in captured_codes]
+    except (KeyError, TypeError) as e:
         emit('error', {'message': f'Invalid card: {str(e)}'})
         return
     
-    result = game_state.play_card(player_index, card, captured)
-    
-    if result['success']:
-        db.record_move(room_id, game_state.round_number, session_info['player_id'], 
-                      card_code, captured_codes, result['is_chkobba'], result['is_haya'])
-        
-        # Check if round ended
-        round_ended = check_round_end(room_id)
+    with state.lock:
+        result = game_state.apply_and_diff(player_index, card, captured)
         
-        if not round_ended:
-            game_state.next_turn()
-            
-            socketio.emit('card_played', {
-                'player_id': session_info['player_id'],
-                'player_index': player_index,
-                'card': card_code,
-                'captured': captured_codes,
-                'is_chkobba': result['is_chkobba'],
-                'is_haya': result['is_haya'],
-                'new_cards_dealt': result.get('new_cards_dealt', False),
-                'next_turn_player': game_state.current_player,
-                'game_state': game_state.to_dict()
-            }, room=f'room_{room_id}')
+        if result['success']:
+            get_db().record_move(room_id, game_state.round_number, session_info['player_id'],
+                                 card._int, card_mask(captured), result['is_chkobba'], result['is_haya'])
             
-            logger.info(f"Card played by player_index {player_index}")
+            # Check if round ended
+            round_ended = check_round_end(room_id)
             
-            process_next_turn(room_id)
-    else:
-        emit('error', {'message': result['message']})
+            if not round_ended:
+                game_state.next_turn()
+                
+                queue_card_played(room_id, {
+                    'player_id': session_info['player_id'],
+                    'player_index': player_index,
+                    'card': card_code,
+                    'captured': captured_codes,
+                    'is_chkobba': result['is_chkobba'],
+                    'is_haya': result['is_haya'],
+                    'new_cards_dealt': result.get('new_cards_dealt', False),
+                    'next_turn_player': game_state.current_player,
+                    'diff': result['diff']
+                })
+                
+                logger.info(f"Card played by player_index {player_index}")
+                
+                process_next_turn(room_id)
+        else:
+            emit('error', {'message': result['message']})
 
 @socketio.on('start_game')
 def handle_start_game(data):
@@ -691,28 +1008,29 @@ def handle_start_game(data):
         return
     
     room_id = session_info['room_id']
-    room = db.get_room_by_id(room_id)
+    room = get_room(room_id)
     
-    player_count = db.get_player_count(room_id)
+    player_count = get_db().get_player_count(room_id)
     if player_count < room['num_players']:
         emit('error', {'message': f'Waiting for players ({player_count}/{room["num_players"]})'})
         return
     
-    if room_id not in active_games:
-        active_games[room_id] = GameState(room['num_players'])
+    state = get_room_state(room_id)
+    if state.game is None:
+        state.game = GameState(room['num_players'])
     
-    current_game_state = active_games[room_id]
+    current_game_state = state.game
     
-    db.create_game_session(room_id, current_game_state.to_dict())
-    db.update_room_status(room_id, 'started')
+    get_db().queue_write('create_game_session', room_id, current_game_state.to_dict())
+    set_room_status(room_id, 'started')
     
-    target_score = room_settings.get(room_id, {}).get('target_score', 21)
+    target_score = state.target_score
     
     socketio.emit('game_started', {
         'game_state': current_game_state.to_dict(),
         'first_player': current_game_state.current_player,
         'target_score': target_score,
-        'player_mapping': player_id_to_index.get(room_id, {})
+        'player_mapping': get_player_mapping(room_id)
     }, room=f'room_{room_id}')
     
     logger.info(f"Game started in room {room_id} with {player_count} players, target score: {target_score}")
@@ -731,7 +1049,7 @@ def handle_continue_game(data):
         return
     
     room_id = session_info['room_id']
-    game_state = active_games.get(room_id)
+    game_state = get_game(room_id)
     
     if not game_state:
         emit('error', {'message': 'Game not found'})
@@ -757,16 +1075,17 @@ def handle_restart_game(data):
         return
     
     room_id = session_info['room_id']
-    room = db.get_room_by_id(room_id)
+    room = get_room(room_id)
     
     # Create new game state
-    active_games[room_id] = GameState(room['num_players'])
-    current_game_state = active_games[room_id]
+    state = get_room_state(room_id)
+    state.game = GameState(room['num_players'])
+    current_game_state = state.game
     
     # Update database
-    db.create_game_session(room_id, current_game_state.to_dict())
+    get_db().queue_write('create_game_session', room_id, current_game_state.to_dict())
     
-    target_score = room_settings.get(room_id, {}).get('target_score', 21)
+    target_score = state.target_score
     
     logger.info(f"Restarting game in room {room_id}")
     
@@ -791,25 +1110,13 @@ def handle_close_room(data):
     
     room_id = session_info['room_id']
     
-    # Cancel any active timers
-    if room_id in turn_timers:
-        turn_timers[room_id].cancel()
-        del turn_timers[room_id]
-    
     # Update room status
-    db.update_room_status(room_id, 'closed')
-    
-    # Clean up
-    if room_id in active_games:
-        del active_games[room_id]
-    if room_id in room_players:
-        del room_players[room_id]
-    if room_id in player_id_to_index:
-        del player_id_to_index[room_id]
-    if room_id in ai_players:
-        del ai_players[room_id]
-    if room_id in room_settings:
-        del room_settings[room_id]
+    set_room_status(room_id, 'closed')
+    
+    # Clean up; a pending timeout finds no room and is dropped
+    rooms.pop(room_id, None)
+    for token in [t for t, p in token_to_player.items() if p['room_id'] == room_id]:
+        del token_to_player[token]
     
     logger.info(f"Room {room_id} closed")
     
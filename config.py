@@ -1,5 +1,25 @@
 import os
+import re
 from datetime import timedelta
+from types import MappingProxyType
+from typing import Final
+
+# Constants read on game and AI hot paths. Import these names directly: a module
+# global read is cheaper than a class attribute lookup, and the read-only
+# mappings cannot be mutated by accident. Config below exposes the same objects.
+WINNING_SCORE: Final = 21
+AI_LEVELS: Final = ('easy', 'medium', 'hard')
+AI_SEARCH_DEPTH: Final = 4  # Plies searched by the hard AI
+CARD_VALUES: Final = MappingProxyType({'A': 1, '2': 2, '3': 3, '4': 4, '5': 5, '6': 6, '7': 7, 'Q': 8, 'J': 9, 'K': 10})
+CARD_SUITS: Final = MappingProxyType({'H': 'Hearts', 'D': 'Diamonds', 'C': 'Clubs', 'S': 'Spades'})
+CARD_RANKS: Final = ('A', '2', '3', '4', '5', '6', '7', 'Q', 'J', 'K')
+
+ALLOWED_IMAGE_FORMATS: Final = frozenset(('png', 'jpg', 'jpeg', 'gif'))
+ALLOWED_AUDIO_FORMATS: Final = frozenset(('mp3', 'wav', 'ogg'))
+# One-call check for an allowed asset filename: ALLOWED_ASSET_RE.search(filename)
+ALLOWED_ASSET_RE: Final = re.compile(
+    r'\.(?:%s)$' % '|'.join(sorted(ALLOWED_IMAGE_FORMATS | ALLOWED_AUDIO_FORMATS)), re.IGNORECASE)
+
 
 class Config:
     """Base configuration for Chkobba application"""
@@ -12,7 +32,7 @@ class Config:
     
     # SocketIO Configuration
     SOCKETIO_CORS_ALLOWED_ORIGINS = '*'
-    SOCKETIO_ASYNC_MODE = 'threading'
+    SOCKETIO_ASYNC_MODE = 'eventlet'
     SOCKETIO_PING_TIMEOUT = 60
     SOCKETIO_PING_INTERVAL = 25
     
@@ -20,10 +40,20 @@ class Config:
     SQLALCHEMY_DATABASE_URI = 'sqlite:///instance/chkobba.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     DATABASE_PATH = os.path.join(os.path.dirname(__file__), 'instance', 'chkobba.db')
+    DATABASE_IN_MEMORY = bool(os.environ.get('CHKOBBA_INMEM'))  # Keep the DB in memory (dev / AI self-play)
+    DATABASE_SNAPSHOT_PATH = os.path.join(os.path.dirname(__file__), 'instance', 'chkobba.snapshot.db')
+    DATABASE_SNAPSHOT_INTERVAL = 60  # Seconds between snapshots of the in-memory DB
+    DB_WRITE_BATCH_SIZE = 64  # Max queued writes committed per transaction
+    DB_WRITE_BATCH_WAIT = 0.05  # Seconds to gather more writes before committing
+    DB_CACHE_SIZE = -64000  # SQLite page cache per connection (negative = KiB)
+    DB_BUSY_TIMEOUT_MS = 5000  # Wait this long for a lock before raising 'database is locked'
+    DB_CACHED_STATEMENTS = 256  # Prepared statements kept per connection
+    DB_ROOM_CACHE_SIZE = 1024  # Rooms kept in the room_code lookup cache
     
     # Game Settings
     DEFAULT_TIMEOUT_SECONDS = 10
-    WINNING_SCORE = 21
+    TIMEOUT_POLL_INTERVAL = 0.5  # Seconds between turn timeout checks
+    WINNING_SCORE = WINNING_SCORE
     MAX_PLAYERS_PER_ROOM = 4
     MIN_PLAYERS_PER_ROOM = 2
     SESSION_TOKEN_EXPIRY = timedelta(hours=24)
@@ -31,13 +61,17 @@ class Config:
     # Asset Configuration
     MAX_UPLOAD_SIZE = 5 * 1024 * 1024  # 5MB
     UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'static', 'uploads')
-    ALLOWED_IMAGE_FORMATS = {'png', 'jpg', 'jpeg', 'gif'}
-    ALLOWED_AUDIO_FORMATS = {'mp3', 'wav', 'ogg'}
+    ALLOWED_IMAGE_FORMATS = ALLOWED_IMAGE_FORMATS
+    ALLOWED_AUDIO_FORMATS = ALLOWED_AUDIO_FORMATS
+    ALLOWED_ASSET_RE = ALLOWED_ASSET_RE
     
     # AI Configuration
-    AI_LEVELS = ['easy', 'medium', 'hard']
+    AI_LEVELS = AI_LEVELS
     DEFAULT_AI_LEVEL = 'medium'
     AI_THINK_TIME_MS = 500  # Milliseconds
+    AI_SEARCH_DEPTH = AI_SEARCH_DEPTH
+    AI_TT_SIZE = 1 << 18  # Transposition table slots per AI player (power of two)
+    AI_POOL_WORKERS = os.cpu_count() or 1  # ai_worker.py processes running the hard AI search
     
     # Game Rules
     CARDS_PER_SUIT = 10
@@ -46,9 +80,9 @@ class Config:
     CARDS_ON_TABLE = 4
     
     # Deck definition (40-card Italian deck)
-    CARD_VALUES = {'A': 1, '2': 2, '3': 3, '4': 4, '5': 5, '6': 6, '7': 7, 'Q': 8, 'J': 9, 'K': 10}
-    CARD_SUITS = {'H': 'Hearts', 'D': 'Diamonds', 'C': 'Clubs', 'S': 'Spades'}
-    CARD_RANKS = ['A', '2', '3', '4', '5', '6', '7', 'Q', 'J', 'K']
+    CARD_VALUES = CARD_VALUES
+    CARD_SUITS = CARD_SUITS
+    CARD_RANKS = CARD_RANKS
     
     # Score categories
     SCORE_CATEGORIES = {
@@ -1,30 +1,214 @@
 import sqlite3
-import json
 import os
-from datetime import datetime
+import hashlib
+import queue
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+import orjson
 from config import Config
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+def dumps(obj):
+    """Encode obj as JSON bytes with orjson (int dict keys are stringified like stdlib json)
+    Bytes are stored as BLOBs, skipping the decode to str and SQLite's text handling.
+    """
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+
+def loads(data):
+    """Decode a JSON column; accepts the BLOBs written by dumps as well as older TEXT rows"""
+    return orjson.loads(data) if data is not None else None
+
+
+def session_game_state(session):
+    """Decode the game state of a game_sessions row
+    state_blob packs {'s': game_state, 'sc': scores, 'ck': chkobba_count}; rows written
+    before it existed only have the separate game_state column.
+    """
+    if session.state_blob is not None:
+        return orjson.loads(session.state_blob)['s']
+    return loads(session.game_state)
+
+
 class Database:
     """SQLite database management for Chkobba game"""
     
-    def __init__(self, db_path=None):
+    # Hot queries, kept as constants so sqlite3's per-connection statement cache always hits
+    SQL_ROOM_BY_CODE = "SELECT * FROM game_rooms WHERE room_code = ?"
+    SQL_PLAYER_BY_TOKEN = "SELECT * FROM game_players WHERE session_token = ?"
+    SQL_PLAYER_BY_ID = "SELECT * FROM game_players WHERE id = ?"
+    SQL_PLAYER_COUNT = "SELECT num_joined FROM game_rooms WHERE id = ?"
+    SQL_GAME_SESSION = "SELECT * FROM game_sessions WHERE room_id = ?"
+    # Bump when _create_schema changes so existing databases run it again
+    SCHEMA_VERSION = 2
+    
+    # UTC timestamp in the datetime.isoformat() layout, computed by SQLite instead of Python
+    SQL_NOW = "strftime('%Y-%m-%dT%H:%M:%f', 'now')"
+    
+    def __init__(self, db_path=None, in_memory=None):
         self.db_path = db_path or Config.DATABASE_PATH
+        # In-memory mode: the live database only exists on the writer connection and is
+        # snapshotted to disk every Config.DATABASE_SNAPSHOT_INTERVAL seconds
+        self.snapshot_path = None
+        if Config.DATABASE_IN_MEMORY if in_memory is None else in_memory:
+            self.db_path = ':memory:'
+            self.snapshot_path = Config.DATABASE_SNAPSHOT_PATH
+        self._writer_conn = None  # Single writer connection, opened on first use
+        self._writer_lock = threading.RLock()
+        self._write_depth = 0  # Nesting of _write blocks; only the outermost commits
+        self._readers = queue.LifoQueue()  # Idle read-only connections
+        self._room_cache = OrderedDict()  # room_code -> game_rooms row (dict), least recently used first
+        self._settings = None  # game_settings row (dict), dropped by update_settings
+        self._row_factories = {}  # table -> cursor row_factory building that table's namedtuple
+        self._token_index = {}  # session_token -> player_id, for rooms still in play
+        self._write_queue = queue.Queue()  # (op, args) writes for the background writer; None stops it
+        self._writer_thread = None  # Started by the first queue_write
+        self._state_hashes = {}  # room_id -> digest of the last state_blob written, to skip no-op updates
         self.ensure_db_exists()
+        
+        if self.snapshot_path:
+            threading.Thread(target=self._snapshot_loop, daemon=True).start()
     
-    def get_connection(self):
-        """Get database connection - creates new connection per call for thread safety"""
-        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+    def get_connection(self, readonly=False):
+        """Open a new database connection (read-only when readonly is set)
+        Callers normally go through _write/_read, which reuse open connections.
+        """
+        if readonly and self.db_path != ':memory:':
+            conn = sqlite3.connect(f'file:{self.db_path}?mode=ro', uri=True, check_same_thread=False,
+                                   cached_statements=Config.DB_CACHED_STATEMENTS)
+        else:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                                   cached_statements=Config.DB_CACHED_STATEMENTS)
         conn.row_factory = sqlite3.Row
+        # Per-connection settings; WAL lets the one fsync per commit go to the log
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA cache_size={Config.DB_CACHE_SIZE}")
+        conn.execute(f"PRAGMA busy_timeout={Config.DB_BUSY_TIMEOUT_MS}")
         return conn
     
+    @contextmanager
+    def _write(self):
+        """Yield a cursor on the writer connection; commits on success, rolls back on error
+        SQLite allows one writer at a time, so writes queue on a lock instead of on the file lock.
+        Nested blocks (see transaction) join the outer transaction.
+        """
+        with self._writer_lock:
+            if self._writer_conn is None:
+                self._writer_conn = self.get_connection()
+            conn = self._writer_conn
+            outermost = self._write_depth == 0
+            self._write_depth += 1
+            try:
+                yield conn.cursor()
+                if outermost:
+                    conn.commit()
+            except Exception:
+                if outermost:
+                    conn.rollback()
+                raise
+            finally:
+                self._write_depth -= 1
+    
+    def transaction(self):
+        """Group several write calls into one transaction (one commit)
+        Usage: with db.transaction(): db.create_room(...); db.add_player(...)
+        """
+        return self._write()
+    
+    @contextmanager
+    def _read(self):
+        """Yield a cursor on a pooled read-only connection
+        An in-memory database only exists on the writer connection, so reads share it.
+        """
+        if self.db_path == ':memory:':
+            with self._write() as cursor:
+                yield cursor
+            return
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = self.get_connection(readonly=True)
+        try:
+            yield conn.cursor()
+        finally:
+            self._readers.put(conn)
+    
     def ensure_db_exists(self):
         """Create database and tables if they don't exist"""
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        if self.db_path != ':memory:':
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with self._write() as cursor:
+            if self.snapshot_path and os.path.exists(self.snapshot_path):
+                self._restore_snapshot(cursor.connection)
+            self._create_schema(cursor)
+            self._build_row_factories(cursor)
+            cursor.execute("SELECT session_token, id FROM game_players "
+                           "WHERE session_token IS NOT NULL AND status = 'connected'")
+            self._token_index.update(cursor.fetchall())
+        logger.info(f"Database initialized at {self.db_path}")
+    
+    def _build_row_factories(self, cursor):
+        """Build a namedtuple row type for each hot table from its actual columns
+        Attribute access on a namedtuple is a slot load, cheaper than sqlite3.Row['name'].
+        Ad-hoc queries keep the sqlite3.Row default.
+        """
+        for table, type_name in (('game_rooms', 'RoomRow'), ('game_players', 'PlayerRow'),
+                                 ('game_sessions', 'SessionRow')):
+            cursor.execute(f"PRAGMA table_info({table})")
+            row_type = namedtuple(type_name, [col['name'] for col in cursor.fetchall()])
+            self._row_factories[table] = lambda _cursor, row, make=row_type._make: make(row)
+    
+    @contextmanager
+    def _read_rows(self, table):
+        """Like _read, but rows come back as the table's namedtuple (SELECT * queries only)"""
+        with self._read() as cursor:
+            cursor.row_factory = self._row_factories[table]
+            yield cursor
+    
+    def _restore_snapshot(self, conn):
+        """Copy the last snapshot into the in-memory database"""
+        source = sqlite3.connect(self.snapshot_path)
+        try:
+            source.backup(conn)
+        finally:
+            source.close()
+        logger.info(f"Restored in-memory database from {self.snapshot_path}")
+    
+    def snapshot(self):
+        """Write the in-memory database to snapshot_path
+        VACUUM INTO refuses to overwrite, so it writes a temp file that then replaces the snapshot.
+        """
+        tmp_path = f"{self.snapshot_path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        with self._writer_lock:
+            self._writer_conn.execute("VACUUM INTO ?", (tmp_path,))
+        os.replace(tmp_path, self.snapshot_path)
+    
+    def _snapshot_loop(self):
+        while True:
+            time.sleep(Config.DATABASE_SNAPSHOT_INTERVAL)
+            try:
+                self.snapshot()
+            except Exception as e:
+                logger.error(f"Database snapshot failed: {str(e)}", exc_info=True)
+    
+    def _create_schema(self, cursor):
+        # Databases already at SCHEMA_VERSION skip the whole script (PRAGMA user_version is 0 on new files)
+        cursor.execute("PRAGMA user_version")
+        if cursor.fetchone()[0] >= self.SCHEMA_VERSION:
+            return
+        
+        # WAL is stored in the database file, so one switch (outside a transaction) is enough;
+        # readers then no longer block the move writer
+        if self.db_path != ':memory:':
+            cursor.execute("PRAGMA journal_mode=WAL")
         
         # Create tables
         cursor.executescript("""
@@ -35,6 +219,7 @@ class Database:
             status TEXT DEFAULT 'waiting',
             game_mode TEXT NOT NULL,
             num_players INTEGER NOT NULL,
+            num_joined INTEGER DEFAULT 0,  -- Kept up to date by the trg_players_* triggers
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             started_at TIMESTAMP,
             finished_at TIMESTAMP
@@ -46,7 +231,7 @@ class Database:
             player_name TEXT NOT NULL,
             is_ai BOOLEAN DEFAULT 0,
             ai_difficulty TEXT,
-            session_token TEXT UNIQUE,
+            session_token TEXT,  -- Unique via idx_player_token (AI seats have none)
             status TEXT DEFAULT 'connected',
             joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             last_seen TIMESTAMP,
@@ -58,9 +243,10 @@ class Database:
             room_id INTEGER NOT NULL UNIQUE,
             current_round INTEGER DEFAULT 1,
             current_turn_player_id INTEGER,
-            game_state TEXT,
-            scores TEXT,
-            chkobba_count TEXT,
+            game_state BLOB,
+            scores BLOB,
+            chkobba_count BLOB,
+            state_blob BLOB,  -- game_state, scores and chkobba_count in one value (see session_game_state)
             started_at TIMESTAMP,
             status TEXT DEFAULT 'active',
             FOREIGN KEY (room_id) REFERENCES game_rooms(id),
@@ -72,8 +258,8 @@ class Database:
             room_id INTEGER NOT NULL,
             round_number INTEGER,
             player_id INTEGER,
-            card_played TEXT,
-            cards_captured TEXT,
+            card_played INTEGER,  -- Card.to_int() id, 0..39
+            cards_captured INTEGER,  -- Bit set of captured card ids (game_logic.card_mask)
             is_chkobba BOOLEAN DEFAULT 0,
             is_haya BOOLEAN DEFAULT 0,
             timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -99,204 +285,381 @@ class Database:
             uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             filesize INTEGER
         );
+        
+        -- game_sessions.room_id is UNIQUE, so it is indexed already
+        CREATE INDEX IF NOT EXISTS idx_players_room ON game_players(room_id);
+        CREATE INDEX IF NOT EXISTS idx_moves_room_round ON game_moves(room_id, round_number);
         """)
         
-        # Initialize settings if not exists
-        cursor.execute("SELECT * FROM game_settings WHERE id = 1")
+        # Tokens are unique among players that have one; databases created while the
+        # column was declared UNIQUE already have a full index on it
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_autoindex_game_players_1'")
         if cursor.fetchone() is None:
+            cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_player_token ON game_players(session_token) "
+                           "WHERE session_token IS NOT NULL")
+        
+        # Databases created before num_joined existed: add and backfill it
+        cursor.execute("PRAGMA table_info(game_rooms)")
+        if 'num_joined' not in [col['name'] for col in cursor.fetchall()]:
+            cursor.execute("ALTER TABLE game_rooms ADD COLUMN num_joined INTEGER DEFAULT 0")
             cursor.execute("""
-                INSERT INTO game_settings (id, card_theme, board_theme)
-                VALUES (1, 'classic', 'classic')
+                UPDATE game_rooms SET num_joined =
+                    (SELECT COUNT(*) FROM game_players WHERE game_players.room_id = game_rooms.id)
             """)
         
-        conn.commit()
-        conn.close()
-        logger.info(f"Database initialized at {self.db_path}")
+        cursor.execute("PRAGMA table_info(game_sessions)")
+        if 'state_blob' not in [col['name'] for col in cursor.fetchall()]:
+            cursor.execute("ALTER TABLE game_sessions ADD COLUMN state_blob BLOB")
+        
+        cursor.executescript("""
+        CREATE TRIGGER IF NOT EXISTS trg_players_ins AFTER INSERT ON game_players BEGIN
+            UPDATE game_rooms SET num_joined = num_joined + 1 WHERE id = NEW.room_id;
+        END;
+        
+        CREATE TRIGGER IF NOT EXISTS trg_players_del AFTER DELETE ON game_players BEGIN
+            UPDATE game_rooms SET num_joined = num_joined - 1 WHERE id = OLD.room_id;
+        END;
+        """)
+        
+        # Initialize settings if not exists
+        cursor.execute("""
+            INSERT OR IGNORE INTO game_settings (id, card_theme, board_theme)
+            VALUES (1, 'classic', 'classic')
+        """)
+        
+        cursor.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
     
     # ========== Room Operations ==========
     
     def create_room(self, room_code, created_by, game_mode, num_players):
         """Create a new game room"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO game_rooms (room_code, created_by, game_mode, num_players)
-            VALUES (?, ?, ?, ?)
-        """, (room_code, created_by, game_mode, num_players))
-        conn.commit()
-        room_id = cursor.lastrowid
-        conn.close()
-        return room_id
+        with self._write() as cursor:
+            cursor.execute("""
+                INSERT INTO game_rooms (room_code, created_by, game_mode, num_players)
+                VALUES (?, ?, ?, ?)
+            """, (room_code, created_by, game_mode, num_players))
+            return cursor.lastrowid
     
     def get_room_by_code(self, room_code):
-        """Get room by room code"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM game_rooms WHERE room_code = ?", (room_code,))
-        result = cursor.fetchone()
-        conn.close()
-        return result
+        """Get room by room code, cached until its status changes"""
+        room = self._room_cache.get(room_code)
+        if room is not None:
+            self._room_cache.move_to_end(room_code)
+            return room
+        
+        with self._read_rows('game_rooms') as cursor:
+            cursor.execute(self.SQL_ROOM_BY_CODE, (room_code,))
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        
+        room = self._room_cache[room_code] = row._asdict()
+        if len(self._room_cache) > Config.DB_ROOM_CACHE_SIZE:
+            self._room_cache.popitem(last=False)
+        return room
     
     def get_room_by_id(self, room_id):
         """Get room by ID"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM game_rooms WHERE id = ?", (room_id,))
-        result = cursor.fetchone()
-        conn.close()
-        return result
+        with self._read_rows('game_rooms') as cursor:
+            cursor.execute("SELECT * FROM game_rooms WHERE id = ?", (room_id,))
+            return cursor.fetchone()
+    
+    def queue_write(self, op, *args):
+        """Queue a write_batch op for the background writer and return immediately"""
+        if self._writer_thread is None:
+            self._writer_thread = threading.Thread(target=self._write_queued, daemon=True)
+            self._writer_thread.start()
+        self._write_queue.put((op, args))
+    
+    def _write_queued(self):
+        """Background writer: apply queued ops, up to DB_WRITE_BATCH_SIZE per transaction"""
+        stopping = False
+        while not stopping:
+            item = self._write_queue.get()
+            if item is None:
+                return
+            ops = [item]
+            deadline = time.monotonic() + Config.DB_WRITE_BATCH_WAIT
+            while len(ops) < Config.DB_WRITE_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._write_queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                ops.append(item)
+            
+            try:
+                self.write_batch(ops)
+            except Exception as e:
+                logger.error(f"DB write batch of {len(ops)} ops failed: {str(e)}", exc_info=True)
+    
+    def close(self):
+        """Apply the queued writes, then close every connection"""
+        if self._writer_thread is not None:
+            self._write_queue.put(None)
+            self._writer_thread.join()
+            self._writer_thread = None
+        with self._writer_lock:
+            if self._writer_conn is not None:
+                self._writer_conn.close()
+                self._writer_conn = None
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+    
+    def write_batch(self, ops):
+        """Apply a list of (op, args) writes in a single transaction
+        Each op names a _<op>(cursor, *args) method, e.g. ('record_move', (...)).
+        Consecutive ops that have a _<op>_many(cursor, args_list) method are applied
+        together, so a run of moves is a single executemany.
+        """
+        with self._write() as cursor:
+            i = 0
+            while i < len(ops):
+                op, args = ops[i]
+                many = getattr(self, f'_{op}_many', None)
+                if many is None:
+                    getattr(self, f'_{op}')(cursor, *args)
+                    i += 1
+                    continue
+                j = i + 1
+                while j < len(ops) and ops[j][0] == op:
+                    j += 1
+                many(cursor, [a for _, a in ops[i:j]])
+                i = j
     
     def update_room_status(self, room_id, status):
-        """Update room status"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        timestamp = datetime.utcnow().isoformat() if status == 'started' else None
+        """Update room status
+        The cached row is patched right away, so get_room_by_code sees the new status
+        before the queued write reaches the database.
+        """
+        for room in self._room_cache.values():
+            if room['id'] == room_id:
+                room['status'] = status
+                break
+        self.queue_write('update_room_status', room_id, status)
+    
+    def _update_room_status(self, cursor, room_id, status):
+        if status in ('finished', 'closed'):
+            cursor.execute("SELECT session_token FROM game_players WHERE room_id = ? AND session_token IS NOT NULL",
+                           (room_id,))
+            for (token,) in cursor.fetchall():
+                self._token_index.pop(token, None)
+        
         column = 'started_at' if status == 'started' else 'finished_at' if status == 'finished' else None
         
         if column:
-            cursor.execute(f"UPDATE game_rooms SET status = ?, {column} = ? WHERE id = ?",
-                         (status, timestamp, room_id))
+            cursor.execute(f"UPDATE game_rooms SET status = ?, {column} = {self.SQL_NOW} WHERE id = ?",
+                         (status, room_id))
         else:
             cursor.execute("UPDATE game_rooms SET status = ? WHERE id = ?", (status, room_id))
-        conn.commit()
-        conn.close()
     
     # ========== Player Operations ==========
     
     def add_player(self, room_id, player_name, is_ai=False, ai_difficulty=None, session_token=None):
         """Add player to room"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO game_players (room_id, player_name, is_ai, ai_difficulty, session_token)
-            VALUES (?, ?, ?, ?, ?)
-        """, (room_id, player_name, is_ai, ai_difficulty, session_token))
-        conn.commit()
-        player_id = cursor.lastrowid
-        conn.close()
-        return player_id
+        with self._write() as cursor:
+            cursor.execute("""
+                INSERT INTO game_players (room_id, player_name, is_ai, ai_difficulty, session_token)
+                VALUES (?, ?, ?, ?, ?)
+            """, (room_id, player_name, is_ai, ai_difficulty, session_token))
+            if session_token:
+                self._token_index[session_token] = cursor.lastrowid
+            return cursor.lastrowid
+    
+    def add_players_bulk(self, room_id, players):
+        """Add several players to a room in one executemany and return their ids in order
+        players are dicts with 'name', 'is_ai' and optionally 'diff' (AI difficulty) and 'token'.
+        """
+        with self._write() as cursor:
+            cursor.executemany("""
+                INSERT INTO game_players (room_id, player_name, is_ai, ai_difficulty, session_token)
+                VALUES (?, ?, ?, ?, ?)
+            """, [(room_id, p['name'], p['is_ai'], p.get('diff'), p.get('token')) for p in players])
+            # Writes are serialized on the writer connection, so the room's newest ids are ours
+            cursor.execute("SELECT id FROM game_players WHERE room_id = ? ORDER BY id DESC LIMIT ?",
+                           (room_id, len(players)))
+            player_ids = [row[0] for row in reversed(cursor.fetchall())]
+        
+        for p, player_id in zip(players, player_ids):
+            if p.get('token'):
+                self._token_index[p['token']] = player_id
+        return player_ids
     
     def get_players_by_room(self, room_id):
         """Get all players in a room"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM game_players WHERE room_id = ?", (room_id,))
-        result = cursor.fetchall()
-        conn.close()
-        return result
+        with self._read_rows('game_players') as cursor:
+            cursor.execute("SELECT * FROM game_players WHERE room_id = ?", (room_id,))
+            return cursor.fetchall()
     
     def get_player_by_id(self, player_id):
         """Get player by ID"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM game_players WHERE id = ?", (player_id,))
-        result = cursor.fetchone()
-        conn.close()
-        return result
+        with self._read_rows('game_players') as cursor:
+            cursor.execute(self.SQL_PLAYER_BY_ID, (player_id,))
+            return cursor.fetchone()
     
     def get_player_by_token(self, session_token):
-        """Get player by session token"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM game_players WHERE session_token = ?", (session_token,))
-        result = cursor.fetchone()
-        conn.close()
-        return result
+        """Get player by session token
+        Known tokens resolve to a primary key fetch; others go through the session_token index.
+        """
+        player_id = self._token_index.get(session_token)
+        with self._read_rows('game_players') as cursor:
+            if player_id is not None:
+                cursor.execute(self.SQL_PLAYER_BY_ID, (player_id,))
+            else:
+                cursor.execute(self.SQL_PLAYER_BY_TOKEN, (session_token,))
+            return cursor.fetchone()
     
     def get_player_count(self, room_id):
         """Get number of players in room"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM game_players WHERE room_id = ?", (room_id,))
-        count = cursor.fetchone()[0]
-        conn.close()
-        return count
+        with self._read() as cursor:
+            cursor.execute(self.SQL_PLAYER_COUNT, (room_id,))
+            row = cursor.fetchone()
+            return row[0] if row else 0
     
     def update_player_status(self, player_id, status):
         """Update player status"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE game_players SET status = ?, last_seen = ? WHERE id = ?",
-                     (status, datetime.utcnow().isoformat(), player_id))
-        conn.commit()
-        conn.close()
+        self.write_batch([('update_player_status', (player_id, status))])
+    
+    def _update_player_status(self, cursor, player_id, status):
+        cursor.execute(f"UPDATE game_players SET status = ?, last_seen = {self.SQL_NOW} WHERE id = ?",
+                     (status, player_id))
     
     # ========== Game Session Operations ==========
     
     def create_game_session(self, room_id, initial_state=None):
         """Create a new game session"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        initial_state = initial_state or {}
-        cursor.execute("""
-            INSERT INTO game_sessions (room_id, game_state, scores, chkobba_count, started_at)
-            VALUES (?, ?, ?, ?, ?)
-        """, (room_id, json.dumps(initial_state), '{}', '{}', datetime.utcnow().isoformat()))
-        conn.commit()
-        session_id = cursor.lastrowid
-        conn.close()
-        return session_id
+        with self._write() as cursor:
+            self._create_game_session(cursor, room_id, initial_state)
+            return cursor.lastrowid
+    
+    def _create_game_session(self, cursor, room_id, initial_state=None):
+        # A restart starts the room's session over instead of failing on the UNIQUE room_id
+        payload = self._pack_state(initial_state or {}, {}, {})
+        cursor.execute(f"""
+            INSERT INTO game_sessions (room_id, state_blob, current_turn_player_id, started_at, status)
+            VALUES (?, ?, NULL, {self.SQL_NOW}, 'active')
+            ON CONFLICT(room_id) DO UPDATE SET
+                state_blob = excluded.state_blob, current_turn_player_id = NULL,
+                started_at = excluded.started_at, status = 'active', current_round = 1,
+                game_state = NULL, scores = NULL, chkobba_count = NULL
+        """, (room_id, payload))
+        self._state_hashes[room_id] = self._state_digest(payload)
     
     def get_game_session(self, room_id):
         """Get game session for room"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM game_sessions WHERE room_id = ?", (room_id,))
-        result = cursor.fetchone()
-        conn.close()
-        return result
+        with self._read_rows('game_sessions') as cursor:
+            cursor.execute(self.SQL_GAME_SESSION, (room_id,))
+            return cursor.fetchone()
     
     def update_game_state(self, room_id, game_state, scores, chkobba_count, current_turn_player_id):
         """Update game state"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        self.write_batch([('update_game_state', (room_id, game_state, scores, chkobba_count, current_turn_player_id))])
+    
+    def _update_game_state(self, cursor, room_id, game_state, scores, chkobba_count, current_turn_player_id):
+        payload = self._pack_state(game_state, scores, chkobba_count)
+        digest = self._state_digest(payload)
+        if self._state_hashes.get(room_id) == digest:
+            return  # Nothing changed since the last write
+        
         cursor.execute("""
-            UPDATE game_sessions SET game_state = ?, scores = ?, chkobba_count = ?, current_turn_player_id = ?
-            WHERE room_id = ?
-        """, (json.dumps(game_state), json.dumps(scores), json.dumps(chkobba_count), current_turn_player_id, room_id))
-        conn.commit()
-        conn.close()
+            UPDATE game_sessions SET state_blob = ?, current_turn_player_id = ? WHERE room_id = ?
+        """, (payload, current_turn_player_id, room_id))
+        self._state_hashes[room_id] = digest
+    
+    @staticmethod
+    def _pack_state(game_state, scores, chkobba_count):
+        return dumps({'s': game_state, 'sc': scores, 'ck': chkobba_count})
+    
+    @staticmethod
+    def _state_digest(payload):
+        return hashlib.blake2b(payload, digest_size=8).digest()
     
     # ========== Move Recording ==========
     
     def record_move(self, room_id, round_num, player_id, card_played, cards_captured, is_chkobba=False, is_haya=False):
-        """Record a player move"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
+        """Record a player move (queued; written by the background writer)
+        card_played is a card id and cards_captured a bit set of card ids (see game_logic.card_mask).
+        Move history is never read back by the live game, so it doesn't need to be written synchronously.
+        """
+        self.queue_write('record_move', room_id, round_num, player_id, card_played, cards_captured, is_chkobba, is_haya)
+    
+    def _record_move(self, cursor, *args):
+        self._record_move_many(cursor, [args])
+    
+    def _record_move_many(self, cursor, moves):
+        cursor.executemany("""
             INSERT INTO game_moves (room_id, round_number, player_id, card_played, cards_captured, is_chkobba, is_haya)
             VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (room_id, round_num, player_id, card_played, json.dumps(cards_captured), is_chkobba, is_haya))
-        conn.commit()
-        conn.close()
+        """, [self._move_params(*args) for args in moves])
+    
+    @staticmethod
+    def _move_params(room_id, round_num, player_id, card_played, cards_captured, is_chkobba=False, is_haya=False):
+        return room_id, round_num, player_id, card_played, cards_captured, is_chkobba, is_haya
     
     # ========== Settings Operations ==========
     
     def get_settings(self):
-        """Get game settings"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM game_settings WHERE id = 1")
-        result = cursor.fetchone()
-        conn.close()
-        return result
+        """Get game settings, cached until update_settings"""
+        if self._settings is None:
+            with self._read() as cursor:
+                cursor.execute("SELECT * FROM game_settings WHERE id = 1")
+                self._settings = dict(cursor.fetchone())
+        return self._settings
     
     def update_settings(self, card_theme=None, board_theme=None, bg_music=None, sound_effects=None):
-        """Update game settings"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
+        """Update game settings (only the given fields, in one UPDATE)"""
+        cols, vals = [], []
         if card_theme:
-            cursor.execute("UPDATE game_settings SET card_theme = ? WHERE id = 1", (card_theme,))
+            cols.append('card_theme = ?')
+            vals.append(card_theme)
         if board_theme:
-            cursor.execute("UPDATE game_settings SET board_theme = ? WHERE id = 1", (board_theme,))
+            cols.append('board_theme = ?')
+            vals.append(board_theme)
         if bg_music is not None:
-            cursor.execute("UPDATE game_settings SET bg_music_enabled = ? WHERE id = 1", (bg_music,))
+            cols.append('bg_music_enabled = ?')
+            vals.append(bg_music)
         if sound_effects is not None:
-            cursor.execute("UPDATE game_settings SET sound_effects_enabled = ? WHERE id = 1", (sound_effects,))
+            cols.append('sound_effects_enabled = ?')
+            vals.append(sound_effects)
+        if not cols:
+            return
         
-        conn.commit()
-        conn.close()
+        with self._write() as cursor:
+            cursor.execute(f"UPDATE game_settings SET {', '.join(cols)}, updated_at = CURRENT_TIMESTAMP WHERE id = 1",
+                           vals)
+        self._settings = None
+
+# Per-process database instance, opened on first use. SQLite connections must not
+# be shared across fork(), so a forked child starts over with its own.
+_db = None
+
+
+def get_db():
+    """Get this process's Database, opening it on first use"""
+    global _db
+    if _db is None:
+        _db = Database()
+    return _db
+
+
+def _reset_after_fork():
+    global _db
+    _db = None
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
 
-# Global database instance
-db = Database()
+def __getattr__(name):
+    # Keeps `from db import db` working for scripts and the shell
+    if name == 'db':
+        return get_db()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,74 +1,216 @@
 import random
+from array import array
+from functools import lru_cache
 from itertools import combinations
-from typing import List, Tuple, Dict, Set
-from config import Config
+from typing import List, Tuple, Dict, Set, Optional
+from config import WINNING_SCORE
 import logging
 
 logger = logging.getLogger(__name__)
 
+CAPTURE_POSITIONS_CACHE_SIZE = 8192
+SMALL_TABLE_SIZE = 4  # Tables up to this size test every subset instead of searching
+
 class Card:
     """Represents a playing card"""
     
+    __slots__ = ('rank', 'suit', 'code', 'value', 'suit_idx', '_int', '_is_diamond', '_is_seven')
+    
     SUITS = {'H': 'Hearts', 'D': 'Diamonds', 'C': 'Clubs', 'S': 'Spades'}
     RANKS = ['A', '2', '3', '4', '5', '6', '7', 'Q', 'J', 'K']
     VALUES = {'A': 1, '2': 2, '3': 3, '4': 4, '5': 5, '6': 6, '7': 7, 'Q': 8, 'J': 9, 'K': 10}
+    RANK_INDEX = {rank: i for i, rank in enumerate(RANKS)}
+    SUIT_INDEX = {suit: i for i, suit in enumerate(SUITS)}
+    _INTERN: Dict[str, 'Card'] = {}  # code -> the one Card instance for that code
     
-    def __init__(self, rank: str, suit: str):
-        self.rank = rank
-        self.suit = suit
-        if rank not in self.VALUES or suit not in self.SUITS:
+    def __new__(cls, rank: str, suit: str):
+        """Return the shared instance for rank/suit, building it on first use
+        Each card exists once (a flyweight), so cards compare and hash by identity.
+        """
+        code = f"{rank}{suit}"  # Card code like '2H' (2 of Hearts)
+        card = cls._INTERN.get(code)
+        if card is not None:
+            return card
+        if rank not in cls.VALUES or suit not in cls.SUITS:
             raise ValueError(f"Invalid card: {rank}{suit}")
+        
+        card = super().__new__(cls)
+        card.rank = rank
+        card.suit = suit
+        card.code = code
+        card.value = cls.VALUES[rank]  # Numeric value of card, looked up once
+        card.suit_idx = cls.SUIT_INDEX[suit]
+        card._int = cls.RANK_INDEX[rank] * 4 + card.suit_idx
+        card._is_diamond = suit == 'D'
+        card._is_seven = rank == '7'
+        return cls._INTERN.setdefault(code, card)
     
-    @property
-    def code(self) -> str:
-        """Return card code like '2H' (2 of Hearts)"""
-        return f"{self.rank}{self.suit}"
+    def __reduce__(self):
+        # Unpickle to the shared instance of this process rather than a copy
+        return Card.from_code, (self.code,)
     
-    @property
-    def value(self) -> int:
-        """Return numeric value of card"""
-        return self.VALUES[self.rank]
+    def to_int(self) -> int:
+        """Return packed card id rank_index * 4 + suit_index (0..39)"""
+        return self._int
     
     @classmethod
     def from_code(cls, code: str):
-        """Create Card from code like '2H'"""
-        if len(code) != 2:
-            raise ValueError(f"Invalid card code: {code}")
-        return cls(code[0], code[1])
+        """Get the Card for a code like '2H' (one shared instance per code)"""
+        card = cls._INTERN.get(code)
+        if card is None:
+            if len(code) != 2:
+                raise ValueError(f"Invalid card code: {code}")
+            card = cls(code[0], code[1])
+        return card
     
     def __repr__(self):
         return self.code
     
-    def __eq__(self, other):
-        if not isinstance(other, Card):
-            return False
-        return self.code == other.code
+    # No __eq__/__hash__: with one instance per card, object identity is card equality
+
+
+# Every card of the deck, interned once at import
+CARD_BY_CODE = {
+    card.code: card
+    for card in (Card.from_code(rank + suit) for suit in Card.SUITS for rank in Card.RANKS)
+}
+
+CARD_BY_INT = tuple(sorted(CARD_BY_CODE.values(), key=Card.to_int))  # card int -> Card
+
+HAYA = CARD_BY_CODE['7D']  # 7 of Diamonds
+DINARI = CARD_BY_CODE['7C']  # 7 of Clubs
+
+
+def _codes(cards) -> str:
+    """Space-separated card codes, for log lines"""
+    return ' '.join(c.code for c in cards)
+
+
+def card_mask(cards) -> int:
+    """Pack cards into a bit set with bit Card.to_int() set for each card"""
+    mask = 0
+    for card in cards:
+        mask |= 1 << card._int
+    return mask
+
+
+# Card value -> card_mask of the four cards with that value
+VALUE_MASKS = {
+    value: card_mask(card for card in CARD_BY_CODE.values() if card.value == value)
+    for value in Card.VALUES.values()
+}
+
+
+def single_winner(counts: List[int], threshold: int) -> Optional[int]:
+    """Index of the one strictly highest count if it reaches threshold, else None (ties win nothing)"""
+    best = -1
+    winner = None
+    tie = False
+    for idx, count in enumerate(counts):
+        if count > best:
+            best, winner, tie = count, idx, False
+        elif count == best:
+            tie = True
+    return winner if not tie and best >= threshold else None
+
+
+def _small_table_kernel(size: int):
+    """Compile a straight-line capture search for tables of exactly size cards
+    The generated function tests every subset of 2+ positions, in itertools.combinations
+    order, with one inlined comparison each, e.g. for size 3:
+        v0, v1, v2 = values
+        if v0 + v1 == target: out.append((0, 1))
+        ...
+    """
+    lines = ['def kernel(values, target):', '    out = []']
+    if size:
+        lines.append(f"    {''.join(f'v{i}, ' for i in range(size))}= values")
+    for r in range(2, size + 1):
+        for combo in combinations(range(size), r):
+            lines.append(f"    if {' + '.join(f'v{i}' for i in combo)} == target: out.append({combo})")
+    lines.append('    return tuple(out)')
+    namespace = {}
+    exec('\n'.join(lines), namespace)
+    return namespace['kernel']
+
+
+# Table size -> its _small_table_kernel, built once at import
+_SMALL_TABLE_KERNELS = tuple(_small_table_kernel(n) for n in range(SMALL_TABLE_SIZE + 1))
+
+
+@lru_cache(maxsize=CAPTURE_POSITIONS_CACHE_SIZE)
+def capture_positions(values: Tuple[int, ...], target: int) -> Tuple[Tuple[int, ...], ...]:
+    """Table positions of every capture worth target, for a table with these card values
+    Singles when a 1-to-1 match exists, otherwise every subset of 2+ cards summing to
+    target, in itertools.combinations order. Depends only on the values, so the result
+    is shared by every table laid out the same way.
+    """
+    singles = tuple((i,) for i, value in enumerate(values) if value == target)
+    if singles:
+        return singles
+    if len(values) <= SMALL_TABLE_SIZE:
+        # At most 11 subsets: testing each beats setting up the search
+        return _SMALL_TABLE_KERNELS[len(values)](values, target)
+    
+    # Grow subsets over the positions in ascending value order, so a branch stops at
+    # the first card that would overshoot target instead of trying every subset
+    order = sorted(range(len(values)), key=values.__getitem__)
+    # rest[j] is the value of order[j:], so a branch also stops once even taking
+    # every card left cannot reach target
+    rest = [0] * (len(order) + 1)
+    for j in range(len(order) - 1, -1, -1):
+        rest[j] = rest[j + 1] + values[order[j]]
+    if rest[0] < target:
+        return ()  # Not even the whole table adds up to target
     
-    def __hash__(self):
-        return hash(self.code)
+    matches = []
+    chosen = []
+    
+    def extend(start, total):
+        for j in range(start, len(order)):
+            if total + rest[j] < target:
+                break
+            pos = order[j]
+            new_total = total + values[pos]
+            if new_total > target:
+                break  # Every later card is at least as large
+            chosen.append(pos)
+            if new_total == target:
+                if len(chosen) > 1:
+                    matches.append(tuple(sorted(chosen)))
+            else:
+                extend(j + 1, new_total)
+            chosen.pop()
+    
+    extend(0, 0)
+    
+    # Same order as itertools.combinations: by size, then by positions
+    matches.sort(key=lambda positions: (len(positions), positions))
+    return tuple(matches)
 
 
 class Deck:
     """Represents a 40-card Italian playing deck"""
     
+    __slots__ = ('cards',)
+    
+    _PROTOTYPE = tuple(CARD_BY_CODE.values())  # The interned cards in deck order, copied by every new deck
+    
     def __init__(self):
         self.cards = self._create_deck()
-        random.shuffle(self.cards)
     
     def _create_deck(self) -> List[Card]:
-        """Create standard 40-card Italian deck (no 8, 9, 10)"""
-        deck = []
-        for suit in Card.SUITS:
-            for rank in Card.RANKS:
-                deck.append(Card(rank, suit))
-        return deck
+        """Create a shuffled standard 40-card Italian deck (no 8, 9, 10)"""
+        # A full-length sample is a uniform shuffle without copying the prototype first
+        return random.sample(self._PROTOTYPE, len(self._PROTOTYPE))
     
     def draw(self, count: int = 1) -> List[Card]:
         """Draw cards from deck"""
-        drawn = []
-        for _ in range(count):
-            if self.cards:
-                drawn.append(self.cards.pop())
+        # Same cards and order as popping count times: the top of the deck is the end of the list
+        if count <= 0:
+            return []
+        drawn = self.cards[:-count - 1:-1]
+        del self.cards[-count:]
         return drawn
     
     def remaining(self) -> int:
@@ -83,112 +225,162 @@ class Deck:
 class GameState:
     """Manages the state of a Chkobba game"""
     
+    __slots__ = ('num_players', 'deck', 'hands', 'captured_cards', 'round_captures', 'table',
+                 'current_player', 'round_number', 'scores', 'chkobba_counts', 'diamond_counts',
+                 'has_haya', 'has_dinari',
+                 'table_bits', '_cards_in_hands', 'is_finished', 'winner', 'last_capturer',
+                 '_dict_version', '_dict_cache', '_dict_cache_version', '_capture_cache',
+                 '_legal_cache', '_mh_player', '_mh_card', '_mh_captured', '_mh_flags')
+    
+    # Bits of the _mh_flags move history column
+    MOVE_CHKOBBA = 1
+    MOVE_HAYA = 2
+    
     def __init__(self, num_players: int = 2):
         if num_players < 2 or num_players > 4:
             raise ValueError("Game must have 2-4 players")
         
         self.num_players = num_players
         self.deck = Deck()
-        self.players = [
-            {
-                'hand': [],
-                'score': 0,
-                'chkobba_count': 0,
-                'captured_cards': [],  # Track captured cards for scoring
-                'round_captures': []    # Cards captured this round
-            }
-            for _ in range(num_players)
-        ]
+        # Per-player state is kept as parallel lists, one entry per player
+        self.hands = [[] for _ in range(num_players)]
+        self.captured_cards = [[] for _ in range(num_players)]  # Track captured cards for scoring
+        self.round_captures = [[] for _ in range(num_players)]  # Cards captured this round
+        
+        self.scores = [0] * num_players
+        self._reset_round_counters()
+        
         self.table = []
+        self.table_bits = 0  # card_mask(self.table), kept in step with every table change
+        self._cards_in_hands = 0  # Cards left across all hands, so the deal check needs no scan
         self.current_player = 0
         self.round_number = 1
-        self.move_history = []
+        # Move history as parallel columns, one entry per move (see move_history)
+        self._mh_player = array('B')
+        self._mh_card = array('B')  # Card.to_int of the played card
+        self._mh_captured = []  # card_mask of the captured cards
+        self._mh_flags = array('B')
         self.is_finished = False
         self.winner = None
         self.last_capturer = None  # Track who made last capture for remaining table cards
         
+        # to_dict() is cached until the next mutation bumps _dict_version
+        self._dict_version = 0
+        self._dict_cache = None
+        self._dict_cache_version = -1
+        
+        # _find_captures results by card value, and get_legal_moves results by
+        # (table_bits, hand mask), for the current table; emptied whenever the table changes
+        self._capture_cache = {}
+        self._legal_cache = {}
+        
         self._setup_game()
     
     def _setup_game(self):
         """Initial game setup"""
         # Deal 3 cards to each player
         for player_idx in range(self.num_players):
-            self.players[player_idx]['hand'] = self.deck.draw(3)
+            self.hands[player_idx] = self.deck.draw(3)
+        self._cards_in_hands = sum(len(hand) for hand in self.hands)
         
         # Deal 4 cards to table
         self.table = self.deck.draw(4)
-        logger.info(f"Game setup complete. Table: {[c.code for c in self.table]}, Deck remaining: {self.deck.remaining()}")
+        self.table_bits = card_mask(self.table)
+        self._capture_cache = {}
+        self._legal_cache = {}
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(f"Game setup complete. Table: {_codes(self.table)}, Deck remaining: {self.deck.remaining()}")
     
     def _deal_new_hands(self):
         """Deal new hands to all players (3 cards each)"""
         if self.deck.remaining() >= self.num_players * 3:
             for player_idx in range(self.num_players):
-                self.players[player_idx]['hand'] = self.deck.draw(3)
-            logger.info(f"Dealt new hands. Deck has {self.deck.remaining()} cards remaining")
+                self.hands[player_idx] = self.deck.draw(3)
+            self._cards_in_hands = self.num_players * 3
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(f"Dealt new hands. Deck has {self.deck.remaining()} cards remaining")
             return True
         return False
     
     def _check_and_deal_cards(self):
-        """Check if all players have empty hands and deal new cards"""
-        all_empty = all(len(player['hand']) == 0 for player in self.players)
-        
-        if all_empty and self.deck.remaining() > 0:
+        """Check if all players have empty hands and deal new cards
+        Once the deck is empty too the round is over; the caller ends it with
+        end_round(), so a play never changes the round or finishes the game.
+        """
+        if self._cards_in_hands == 0 and self.deck.remaining() > 0:
             self._deal_new_hands()
             return True
-        elif all_empty and self.deck.remaining() == 0:
-            # Round is over - calculate scores
-            self.end_round()
-            return False
         return False
     
     def get_legal_moves(self, player_idx: int) -> List[Tuple[Card, List[Card]]]:
         """Get all legal moves for a player
-        Returns list of (card_to_play, cards_to_capture) tuples
+        Returns list of (card_to_play, cards_to_capture) tuples; the capture lists are
+        shared with the move cache and must not be modified
         """
-        hand = self.players[player_idx]['hand']
+        hand = self.hands[player_idx]
+        key = (self.table_bits, card_mask(hand))
+        cached = self._legal_cache.get(key)
+        if cached is not None:
+            return list(cached)
+        
         legal_moves = []
+        can_skip = False
         
         for card in hand:
             captures = self._find_captures(card)
             for capture_set in captures:
                 legal_moves.append((card, capture_set))
+            if not captures:
+                can_skip = True
         
-        # Players can always play any card without capturing
-        for card in hand:
-            legal_moves.append((card, []))
+        # Any card may be played without capturing unless every card in hand can capture
+        if can_skip:
+            for card in hand:
+                legal_moves.append((card, []))
         
+        self._legal_cache[key] = tuple(legal_moves)
         return legal_moves
     
     def _find_captures(self, card: Card) -> List[List[Card]]:
-        """Find all possible capture combinations for a card"""
-        captures = []
-        card_value = card.value
-        
-        # Single card capture (1-to-1 match)
-        for table_card in self.table:
-            if table_card.value == card_value:
-                captures.append([table_card])
-        
-        # Sum captures (2 or more cards) - only if no 1-to-1 match exists
-        if not captures:  # Only allow combo captures if no single card match
-            for r in range(2, len(self.table) + 1):
-                for combo in combinations(self.table, r):
-                    if sum(c.value for c in combo) == card_value:
-                        captures.append(list(combo))
-        
+        """Find all possible capture combinations for a card
+        Results are cached per card value until the table changes, so callers
+        must not modify the returned lists.
+        """
+        captures = self._capture_cache.get(card.value)
+        if captures is None:
+            captures = self._capture_cache[card.value] = self._search_captures(card.value)
         return captures
     
-    def _has_single_card_match(self, card: Card) -> bool:
-        """Check if card has a 1-to-1 match on the table"""
-        card_value = card.value
-        for table_card in self.table:
-            if table_card.value == card_value:
-                return True
-        return False
+    def _search_captures(self, card_value: int) -> List[List[Card]]:
+        """Subset-sum search behind _find_captures"""
+        table = self.table
+        return [
+            [table[i] for i in positions]
+            for positions in capture_positions(tuple(c.value for c in table), card_value)
+        ]
+    
+    def _add_captures(self, player_idx: int, cards: List[Card]):
+        """Add captured cards to a player's piles and update the round scoring counters"""
+        self.captured_cards[player_idx].extend(cards)
+        self.round_captures[player_idx].extend(cards)
+        for c in cards:
+            if c._is_diamond:
+                self.diamond_counts[player_idx] += 1
+                if c._is_seven:
+                    self.has_haya[player_idx] = True
+            elif c._is_seven and c.suit == 'C':
+                self.has_dinari[player_idx] = True
+    
+    def _reset_round_counters(self):
+        """Zero the per-round counters (chkobbas, diamonds, special sevens)"""
+        self.chkobba_counts = [0] * self.num_players
+        self.diamond_counts = [0] * self.num_players
+        self.has_haya = [False] * self.num_players
+        self.has_dinari = [False] * self.num_players
     
     def _has_non_capturing_card(self, player_idx: int) -> bool:
         """Check if player has at least one card that cannot capture anything"""
-        hand = self.players[player_idx]['hand']
+        hand = self.hands[player_idx]
         
         for card in hand:
             captures = self._find_captures(card)
@@ -203,63 +395,73 @@ class GameState:
         Returns:
             Dict with 'success', 'is_chkobba', 'is_haya', 'message', 'new_cards_dealt'
         """
-        logger.info(f"Player {player_idx} attempting to play {card.code} and capture {[c.code for c in captured_cards]}")
-        logger.info(f"Current table: {[c.code for c in self.table]}")
-        logger.info(f"Player hand: {[c.code for c in self.players[player_idx]['hand']]}")
+        # Checked once so the card lists below are only built when INFO is logged
+        log_info = logger.isEnabledFor(logging.INFO)
+        if log_info:
+            logger.info(f"Player {player_idx} attempting to play {card.code} and capture {_codes(captured_cards)}")
+            logger.info(f"Current table: {_codes(self.table)}")
+            logger.info(f"Player hand: {_codes(self.hands[player_idx])}")
         
         if self.current_player != player_idx:
             return {'success': False, 'message': 'Not your turn'}
         
-        hand = self.players[player_idx]['hand']
-        if card not in hand:
-            logger.error(f"Card {card.code} not in hand: {[c.code for c in hand]}")
+        hand = self.hands[player_idx]
+        try:
+            hand_pos = hand.index(card)  # Found once here and reused to remove the card
+        except ValueError:
+            logger.error(f"Card {card.code} not in hand: {_codes(hand)}")
             return {'success': False, 'message': 'Card not in hand'}
         
         # Validate capture
-        is_valid, msg = self._validate_capture(card, captured_cards, player_idx)
+        is_valid, msg = self._validate_capture(card, captured_cards, player_idx, self._find_captures(card))
         if not is_valid:
             logger.error(f"Capture validation failed: {msg}")
             return {'success': False, 'message': msg}
         
         # Execute play
-        hand.remove(card)
+        self._dict_version += 1
+        self._capture_cache = {}
+        self._legal_cache = {}
+        del hand[hand_pos]
+        self._cards_in_hands -= 1
         
         # Add captured cards to player's collection
         if captured_cards:
-            self.players[player_idx]['captured_cards'].extend(captured_cards)
-            self.players[player_idx]['round_captures'].extend(captured_cards)
+            self._add_captures(player_idx, captured_cards)
             self.last_capturer = player_idx  # Track last capturer
             
-            for captured_card in captured_cards:
-                self.table.remove(captured_card)
+            captured_bits = card_mask(captured_cards)
+            self.table[:] = [c for c in self.table if not captured_bits >> c._int & 1]
+            self.table_bits &= ~captured_bits
         
         is_chkobba = len(self.table) == 0 and len(captured_cards) > 0
-        is_haya = any(c.rank == '7' and c.suit == 'D' for c in captured_cards)
+        is_haya = HAYA in captured_cards
         
         if is_chkobba:
-            self.players[player_idx]['chkobba_count'] += 1
-            logger.info(f"CHKOBBA! Player {player_idx} now has {self.players[player_idx]['chkobba_count']} chkobbas")
+            self.chkobba_counts[player_idx] += 1
+            if log_info:
+                logger.info(f"CHKOBBA! Player {player_idx} now has {self.chkobba_counts[player_idx]} chkobbas")
         
         # If no cards captured, add to table
         if not captured_cards:
             self.table.append(card)
-            logger.info(f"No capture. Card {card.code} added to table")
-        else:
-            logger.info(f"Captured {len(captured_cards)} cards: {[c.code for c in captured_cards]}")
+            self.table_bits |= 1 << card._int
+            if log_info:
+                logger.info(f"No capture. Card {card.code} added to table")
+        elif log_info:
+            logger.info(f"Captured {len(captured_cards)} cards: {_codes(captured_cards)}")
         
         # Record move
-        self.move_history.append({
-            'player': player_idx,
-            'card': card.code,
-            'captured': [c.code for c in captured_cards],
-            'is_chkobba': is_chkobba,
-            'is_haya': is_haya
-        })
+        self._mh_player.append(player_idx)
+        self._mh_card.append(card._int)
+        self._mh_captured.append(card_mask(captured_cards))
+        self._mh_flags.append(is_chkobba * self.MOVE_CHKOBBA | is_haya * self.MOVE_HAYA)
         
         # Check if we need to deal new cards
         new_cards_dealt = self._check_and_deal_cards()
         
-        logger.info(f"Table after play: {[c.code for c in self.table]}")
+        if log_info:
+            logger.info(f"Table after play: {_codes(self.table)}")
         
         return {
             'success': True,
@@ -269,7 +471,53 @@ class GameState:
             'message': 'Card played successfully'
         }
     
-    def _validate_capture(self, card: Card, captured_cards: List[Card], player_idx: int) -> Tuple[bool, str]:
+    @property
+    def move_history(self) -> List[Dict]:
+        """Every move played so far as dicts, decoded from the compact history columns
+        Captured codes come back in card order rather than the order they were sent.
+        """
+        return [
+            {
+                'player': player,
+                'card': CARD_BY_INT[card].code,
+                'captured': [c.code for c in CARD_BY_INT if captured >> c._int & 1],
+                'is_chkobba': bool(flags & self.MOVE_CHKOBBA),
+                'is_haya': bool(flags & self.MOVE_HAYA)
+            }
+            for player, card, captured, flags in zip(self._mh_player, self._mh_card, self._mh_captured, self._mh_flags)
+        ]
+    
+    def apply_and_diff(self, player_idx: int, card: Card, captured_cards: List[Card]) -> Dict:
+        """Play a card and describe only what changed
+        
+        Returns the play_card result with an extra 'diff' on success, so clients
+        holding the previous to_dict() snapshot can patch it instead of receiving
+        the whole state again. Every diff carries the 'version' (move count) it
+        produces; a client whose snapshot is not at version - 1 has missed a move
+        and must resync.
+        """
+        result = self.play_card(player_idx, card, captured_cards)
+        if not result['success']:
+            return result
+        
+        diff = {
+            'player_index': player_idx,
+            'hand_removed': card.code,
+            'table_removed': [c.code for c in captured_cards],
+            'table_added': [] if captured_cards else [card.code],
+            'chkobba_count': self.chkobba_counts[player_idx],
+            'captured_count': len(self.round_captures[player_idx]),
+            'deck_remaining': self.deck.remaining(),
+            'version': len(self._mh_card)
+        }
+        if result['new_cards_dealt']:
+            diff['hands'] = [[c.code for c in hand] for hand in self.hands]
+        
+        result['diff'] = diff
+        return result
+    
+    def _validate_capture(self, card: Card, captured_cards: List[Card], player_idx: int,
+                          possible_captures: List[List[Card]] = None) -> Tuple[bool, str]:
         """Validate card capture according to Chkobba rules
         
         Rules:
@@ -277,13 +525,19 @@ class GameState:
         2. If player has at least one card that cannot capture, capture is OPTIONAL
         3. If a 1-to-1 match exists, combo captures are NOT allowed
         4. Captured cards must sum to card value
+        
+        possible_captures is _find_captures(card) when the caller already has it.
         """
         card_value = card.value
         
-        logger.info(f"Validating capture: card={card.code} (value={card_value}), captured={[c.code for c in captured_cards]}")
+        # Runs on every play, so its traces are DEBUG and only formatted when enabled
+        log_debug = logger.isEnabledFor(logging.DEBUG)
+        if log_debug:
+            logger.debug(f"Validating capture: card={card.code} (value={card_value}), captured={_codes(captured_cards)}")
         
         # Check if this card can capture
-        possible_captures = self._find_captures(card)
+        if possible_captures is None:
+            possible_captures = self._find_captures(card)
         
         # If no captures and attempting to skip
         if not captured_cards:
@@ -296,71 +550,73 @@ class GameState:
                     logger.error(f"Cannot skip capture - all cards in hand can capture")
                     return False, 'You must capture! All your cards can capture, so skipping is not allowed.'
                 else:
-                    logger.info("Skipping capture allowed - player has non-capturing cards")
+                    logger.debug("Skipping capture allowed - player has non-capturing cards")
                     return True, ''
             else:
                 # Card cannot capture - valid skip
-                logger.info("No captures possible - valid play")
+                logger.debug("No captures possible - valid play")
                 return True, ''
         
         # Player is attempting to capture
         # Check if 1-to-1 match exists
-        has_single_match = self._has_single_card_match(card)
+        has_single_match = bool(self.table_bits & VALUE_MASKS[card_value])
         
         # If 1-to-1 match exists and player is trying combo capture
         if has_single_match and len(captured_cards) > 1:
             logger.error(f"1-to-1 match exists for {card.code}, combo capture not allowed")
             return False, f'You must capture the single matching card (not a combination) when a 1-to-1 match exists'
         
-        # Convert table to codes for comparison
-        table_codes = [c.code for c in self.table]
-        
         # All captured cards must be on table
-        for cap_card in captured_cards:
-            if cap_card.code not in table_codes:
-                logger.error(f"Card {cap_card.code} not on table. Table: {table_codes}")
-                return False, f'{cap_card.code} is not on table'
-        
-        # Sum must match card value
-        total_value = sum(c.value for c in captured_cards)
-        logger.info(f"Capture sum: {total_value}, card value: {card_value}")
-        
-        if total_value != card_value:
-            return False, f'Captured cards sum ({total_value}) does not match card value ({card_value})'
+        captured_bits = card_mask(captured_cards)
+        missing_bits = captured_bits & ~self.table_bits
+        if missing_bits:
+            cap_card = next(c for c in captured_cards if missing_bits >> c._int & 1)
+            logger.error(f"Card {cap_card.code} not on table. Table: {_codes(self.table)}")
+            return False, f'{cap_card.code} is not on table'
         
         # Verify this is a valid capture combination
-        captured_codes = [c.code for c in captured_cards]
-        is_valid_combo = any(
-            sorted([c.code for c in combo]) == sorted(captured_codes)
+        # Table cards are unique, so equal bit sets mean the same combo once repeats are ruled out
+        is_valid_combo = bin(captured_bits).count('1') == len(captured_cards) and any(
+            card_mask(combo) == captured_bits
             for combo in possible_captures
         )
         
         if not is_valid_combo:
-            logger.error(f"Invalid capture combination. Attempted: {captured_codes}, Valid: {[[c.code for c in combo] for combo in possible_captures]}")
+            # Every valid combo sums to card value, so the sum is only needed to explain a rejection
+            total_value = sum(c.value for c in captured_cards)
+            if log_debug:
+                logger.debug(f"Capture sum: {total_value}, card value: {card_value}")
+            if total_value != card_value:
+                return False, f'Captured cards sum ({total_value}) does not match card value ({card_value})'
+            
+            logger.error(f"Invalid capture combination. Attempted: {_codes(captured_cards)}, Valid: {' | '.join(_codes(combo) for combo in possible_captures)}")
             return False, 'Invalid capture combination'
         
-        logger.info("Capture validation successful")
+        logger.debug("Capture validation successful")
         return True, ''
     
-    def end_round(self) -> Dict:
-        """Calculate scores for current round"""
+    def end_round(self) -> List[int]:
+        """Calculate scores for current round, returned per player index"""
         logger.info(f"=== END OF ROUND {self.round_number} ===")
+        self._dict_version += 1
+        self._capture_cache = {}
+        self._legal_cache = {}
         
         # Give remaining table cards to last capturer
         if self.table and self.last_capturer is not None:
             logger.info(f"Giving {len(self.table)} remaining table cards to player {self.last_capturer}")
-            self.players[self.last_capturer]['captured_cards'].extend(self.table)
-            self.players[self.last_capturer]['round_captures'].extend(self.table)
+            self._add_captures(self.last_capturer, self.table)
             self.table = []
+            self.table_bits = 0
         
         scores = self._calculate_round_scores()
         
         # Add round scores to player totals
-        for idx, round_score in scores.items():
-            old_score = self.players[idx]['score']
-            self.players[idx]['score'] += round_score
-            logger.info(f"Player {idx}: {old_score} + {round_score} = {self.players[idx]['score']}")
-            if self.players[idx]['score'] >= Config.WINNING_SCORE:
+        for idx, round_score in enumerate(scores):
+            old_score = self.scores[idx]
+            self.scores[idx] += round_score
+            logger.info(f"Player {idx}: {old_score} + {round_score} = {self.scores[idx]}")
+            if self.scores[idx] >= WINNING_SCORE:
                 self.is_finished = True
                 self.winner = idx
         
@@ -369,6 +625,7 @@ class GameState:
             logger.info(f"Starting next round {self.round_number + 1}")
             self.round_number += 1
             self.table = []
+            self.table_bits = 0
             self.last_capturer = None
             
             # CRITICAL FIX: Create a NEW deck for the new round
@@ -376,11 +633,10 @@ class GameState:
             logger.info(f"NEW DECK created with {self.deck.remaining()} cards")
             
             # Reset player round data
-            for player in self.players:
-                player['hand'] = []
-                player['round_captures'] = []
-                player['chkobba_count'] = 0
-                # Keep captured_cards and score for game tracking
+            self.hands = [[] for _ in range(self.num_players)]
+            self.round_captures = [[] for _ in range(self.num_players)]
+            # Keep captured_cards and score for game tracking
+            self._reset_round_counters()
             
             # Setup new round
             self._setup_game()
@@ -389,7 +645,7 @@ class GameState:
         
         return scores
     
-    def _calculate_round_scores(self) -> Dict[int, int]:
+    def _calculate_round_scores(self) -> List[int]:
         """Calculate scores for current round based on Chkobba rules
         
         Scoring criteria:
@@ -399,55 +655,49 @@ class GameState:
         4. 7 of Clubs (Dinari): 1 point
         5. Each Chkobba: 1 point
         """
-        round_scores = {i: 0 for i in range(self.num_players)}
+        round_scores = [0] * self.num_players
         
         logger.info(f"\n=== SCORING ROUND {self.round_number} ===")
         
-        # Count cards and diamonds for each player
-        card_counts = {}
-        diamond_counts = {}
+        # Count cards for each player (the other counters are kept as cards are captured)
+        card_counts = [len(cards) for cards in self.round_captures]
+        diamond_counts = self.diamond_counts
         
-        for idx, player in enumerate(self.players):
-            card_counts[idx] = len(player['round_captures'])
-            diamond_counts[idx] = sum(1 for c in player['round_captures'] if c.suit == 'D')
-            logger.info(f"Player {idx}: {card_counts[idx]} cards, {diamond_counts[idx]} diamonds, {player['chkobba_count']} chkobbas")
-            logger.info(f"  Round captures: {[c.code for c in player['round_captures']]}")
+        if logger.isEnabledFor(logging.INFO):
+            for idx, round_captures in enumerate(self.round_captures):
+                logger.info(f"Player {idx}: {card_counts[idx]} cards, {diamond_counts[idx]} diamonds, {self.chkobba_counts[idx]} chkobbas")
+                logger.info(f"  Round captures: {_codes(round_captures)}")
         
         # 1. Most Cards (21+ out of 40)
-        max_cards = max(card_counts.values())
-        winners = [idx for idx, count in card_counts.items() if count == max_cards]
-        if len(winners) == 1 and card_counts[winners[0]] >= 21:  # No tie
-            round_scores[winners[0]] += 1
-            logger.info(f"✓ Player {winners[0]} gets 1 point for most cards ({card_counts[winners[0]]})")
+        winner = single_winner(card_counts, 21)
+        if winner is not None:
+            round_scores[winner] += 1
+            logger.info(f"✓ Player {winner} gets 1 point for most cards ({card_counts[winner]})")
         else:
-            logger.info(f"✗ No point for most cards (max={max_cards}, winners={winners})")
+            logger.info(f"✗ No point for most cards (counts={card_counts})")
         
         # 2. Most Diamonds
-        max_diamonds = max(diamond_counts.values()) if diamond_counts else 0
-        winners = [idx for idx, count in diamond_counts.items() if count == max_diamonds]
-        if len(winners) == 1 and diamond_counts[winners[0]] > 0:  # No tie
-            round_scores[winners[0]] += 1
-            logger.info(f"✓ Player {winners[0]} gets 1 point for most diamonds ({diamond_counts[winners[0]]})")
+        winner = single_winner(diamond_counts, 1)
+        if winner is not None:
+            round_scores[winner] += 1
+            logger.info(f"✓ Player {winner} gets 1 point for most diamonds ({diamond_counts[winner]})")
         else:
-            logger.info(f"✗ No point for most diamonds (max={max_diamonds}, winners={winners})")
+            logger.info(f"✗ No point for most diamonds (counts={diamond_counts})")
         
         # 3. 7 of Diamonds (Haya)
-        haya = Card('7', 'D')
-        for idx, player in enumerate(self.players):
-            if haya in player['round_captures']:
+        for idx, has_haya in enumerate(self.has_haya):
+            if has_haya:
                 round_scores[idx] += 1
                 logger.info(f"✓ Player {idx} gets 1 point for 7 of Diamonds (Haya)")
         
         # 4. 7 of Clubs (Dinari)
-        dinari = Card('7', 'C')
-        for idx, player in enumerate(self.players):
-            if dinari in player['round_captures']:
+        for idx, has_dinari in enumerate(self.has_dinari):
+            if has_dinari:
                 round_scores[idx] += 1
                 logger.info(f"✓ Player {idx} gets 1 point for 7 of Clubs (Dinari)")
         
         # 5. Chkobbas
-        for idx, player in enumerate(self.players):
-            chkobba_points = player['chkobba_count']
+        for idx, chkobba_points in enumerate(self.chkobba_counts):
             round_scores[idx] += chkobba_points
             if chkobba_points > 0:
                 logger.info(f"✓ Player {idx} gets {chkobba_points} points for {chkobba_points} Chkobba(s)")
@@ -459,28 +709,40 @@ class GameState:
         """Move to next player's turn"""
         if not self.is_finished:
             self.current_player = (self.current_player + 1) % self.num_players
-            logger.info(f"Turn changed to player {self.current_player}")
+            self._dict_version += 1
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(f"Turn changed to player {self.current_player}")
     
     def to_dict(self) -> Dict:
-        """Convert game state to dictionary for serialization"""
-        return {
+        """Convert game state to dictionary for serialization
+        
+        The dict is rebuilt only after the state changes, so callers must treat
+        it as read-only.
+        """
+        if self._dict_cache_version == self._dict_version:
+            return self._dict_cache
+        
+        self._dict_cache = {
             'num_players': self.num_players,
             'round': self.round_number,
             'current_player': self.current_player,
             'players': [
                 {
-                    'hand': [c.code for c in p['hand']],
-                    'score': p['score'],
-                    'chkobba_count': p['chkobba_count'],
-                    'captured_count': len(p['round_captures'])
+                    'hand': [c.code for c in hand],
+                    'score': self.scores[idx],
+                    'chkobba_count': self.chkobba_counts[idx],
+                    'captured_count': len(self.round_captures[idx])
                 }
-                for p in self.players
+                for idx, hand in enumerate(self.hands)
             ],
             'table': [c.code for c in self.table],
             'deck_remaining': self.deck.remaining(),
             'is_finished': self.is_finished,
-            'winner': self.winner
+            'winner': self.winner,
+            'version': len(self._mh_card)
         }
+        self._dict_cache_version = self._dict_version
+        return self._dict_cache
     
     @staticmethod
     def from_dict(data: Dict) -> 'GameState':
@@ -105,14 +105,29 @@ socket.on('game_state_update', (data) => {
   }
 });
 
-socket.on('card_played', (data) => {
+socket.on('card_played', handleCardPlayed);
+
+// Consecutive AI moves arrive together; apply them in order
+socket.on('moves_batch', (data) => {
+  console.log('Moves batch:', data);
+  for (const move of data.moves) {
+    if (!handleCardPlayed(move)) break;
+  }
+});
+
+function handleCardPlayed(data) {
   console.log('Card played:', data);
   if (typeof audioManager !== 'undefined') {
     audioManager.play('card_play');
   }
   
-  // Update game board with new state
-  updateGameBoard(data.game_state);
+  // Patch our copy of the game state; resync from the server if we have none
+  const state = applyGameStateDiff(data.diff, data.next_turn_player);
+  if (!state) {
+    emitJoinGame();
+    return false;
+  }
+  updateGameBoard(state);
   
   if (data.new_cards_dealt) {
     showInfo('🎴 New cards dealt!');
@@ -147,7 +162,8 @@ socket.on('card_played', (data) => {
     }
     showInfo('🔔 Your turn!');
   }
-});
+  return true;
+}
 
 socket.on('hand_updated', (data) => {
   console.log('Hand updated:', data);
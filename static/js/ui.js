@@ -167,6 +167,8 @@ function updateGameBoard(state) {
   console.log('Player index:', gameState.player_index);
   console.log('Game status:', gameState.game_status);
   
+  gameState.board_state = state;
+  
   // Update table cards
   gameState.table_cards = state.table || [];
   
@@ -225,6 +227,43 @@ function updateGameBoard(state) {
   });
 }
 
+/**
+ * Apply a card_played diff to the last full game state.
+ * Returns the patched state, or null if there is no base state to patch.
+ */
+function applyGameStateDiff(diff, nextPlayer) {
+  // A gap in versions means we missed a move; the caller resyncs instead
+  const base = gameState.board_state;
+  if (!base || !base.players || !base.players[diff.player_index] ||
+      base.version + 1 !== diff.version) {
+    return null;
+  }
+  
+  const removed = new Set(diff.table_removed);
+  const players = base.players.map((player, idx) => {
+    const updated = { ...player };
+    if (diff.hands) {
+      updated.hand = diff.hands[idx];
+    } else if (idx === diff.player_index) {
+      updated.hand = player.hand.filter(code => code !== diff.hand_removed);
+    }
+    if (idx === diff.player_index) {
+      updated.chkobba_count = diff.chkobba_count;
+      updated.captured_count = diff.captured_count;
+    }
+    return updated;
+  });
+  
+  return {
+    ...base,
+    players,
+    table: base.table.filter(code => !removed.has(code)).concat(diff.table_added),
+    deck_remaining: diff.deck_remaining,
+    current_player: nextPlayer,
+    version: diff.version
+  };
+}
+
 function updateCurrentTurn() {
   const currentPlayerName = gameState.players[gameState.current_player]?.name || 'Unknown';
   const el = document.getElementById('current-player-name');
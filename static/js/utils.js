@@ -92,6 +92,7 @@ const gameState = {
   game_status: 'waiting',
   selected_card: null,
   captured_cards: [],
+  board_state: null,  // Last full game state, patched by card_played diffs
   
   reset() {
     this.room_code = null;
@@ -107,6 +108,7 @@ const gameState = {
     this.game_status = 'waiting';
     this.selected_card = null;
     this.captured_cards = [];
+    this.board_state = null;
   },
   
   save() {
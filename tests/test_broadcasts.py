@@ -0,0 +1,34 @@
+import pytest
+
+pytest.importorskip('flask_socketio')
+pytest.importorskip('eventlet')
+
+import app
+from ai import AIPlayer
+from game_logic import GameState
+
+
+@pytest.fixture
+def ai_room(monkeypatch):
+    """A started 2-player room where seat 0 is human and seat 1 (up next) is AI"""
+    room_id = 4242
+    game = GameState(2)
+    game.current_player = 1
+    app.rooms[room_id] = app.RoomState(game=game, players=[1, 2], ai_players={1: AIPlayer('easy')})
+    monkeypatch.setattr(app, 'get_room', lambda rid: {'status': 'started', 'num_players': 2})
+
+    events = []
+    monkeypatch.setattr(app.socketio, 'emit', lambda event, data=None, **kwargs: events.append(event))
+    monkeypatch.setattr(app.socketio, 'start_background_task',
+                        lambda target, *args: events.append('ai_turn_started'))
+    yield room_id, events
+    app.rooms.pop(room_id, None)
+
+
+def test_human_play_is_sent_before_the_ai_turn(ai_room):
+    room_id, events = ai_room
+    app.queue_card_played(room_id, {'player_index': 0, 'card': '1H'})
+
+    app.process_next_turn(room_id)
+
+    assert events == ['card_played', 'ai_turn_started']